@@ -0,0 +1,257 @@
+# archive.py
+# Packed binary puzzles, and archives of many of them that are read through
+# mmap, so a batch job can go straight to any puzzle without parsing text.
+#
+# A puzzle record, all integers little-endian:
+#   u8 name length, then the name in UTF-8
+#   u8 rows, u8 cols                 as on the .kro dim line
+#   u16 number of black squares
+#   bitmap of the (rows+1) x (cols+1) board in row-major order, one bit per
+#     square, set for black squares, padded to a whole byte
+#   u8 across, u8 down               for each black square in row-major order
+#   one nibble per white square in row-major order, the low nibble first,
+#     holding its solution digit, or 0 if the solution is unknown
+#
+# An archive:
+#   header  '4s H H I'   magic, version, reserved, number of puzzles
+#   index   'Q I'        offset and length of each record, by puzzle id
+#   the records
+#
+# Usage:
+#   python archive.py pack archive.kar path ...    (.kro files, directories
+#                                                   or glob patterns)
+#   python archive.py unpack archive.kar directory
+#   python archive.py list archive.kar
+
+import argparse
+import mmap
+import os.path
+import struct
+import sys
+from kro import KroPuzzle, readKro, writeKro, KroError, strayClues
+
+MAGIC = b'KKRO'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+ENTRY = struct.Struct('<QI')
+SIZES = struct.Struct('<BBH')
+
+class ArchiveError(Exception):
+  pass
+
+def packPuzzle(puzzle, name = ''):
+  # Returns the binary record of a kro.KroPuzzle
+
+  rows, cols = puzzle.rows+1, puzzle.cols+1
+  if not (0 < rows <= 256 and 0 < cols <= 256):
+    raise ArchiveError('%s: puzzle too large to pack' % name)
+  label = name.encode('utf-8')[:255]
+  bitmap = bytearray((rows*cols + 7) // 8)
+  clues = bytearray()
+  nibbles = bytearray()
+  for r in range(rows):
+    for c in range(cols):
+      if (r, c) in puzzle.clues:
+        k = r*cols + c
+        bitmap[k >> 3] |= 1 << (k & 7)
+        clues.extend(puzzle.clues[r, c])
+      else:
+        nibbles.append(puzzle.solution.get((r, c), 0))
+  digits = bytearray((len(nibbles) + 1) // 2)
+  for k, d in enumerate(nibbles):
+    digits[k >> 1] |= d << (4 * (k & 1))
+  record = bytearray([len(label)]) + label
+  record += SIZES.pack(puzzle.rows, puzzle.cols, len(puzzle.clues))
+  return bytes(record + bitmap + clues + digits)
+
+def unpackPuzzle(data, offset = 0, end = None):
+  # Returns (name, puzzle) for the record starting at offset in data, which
+  # may be a bytes object or an mmap, and ending by end (by default the end
+  # of data)
+
+  if end is None:
+    end = len(data)
+
+  def need(nbytes):
+    if offset + nbytes > end:
+      raise ArchiveError('truncated puzzle record')
+
+  need(1)
+  size = bytearray(data[offset:offset+1])[0]
+  need(1 + size + SIZES.size)
+  name = bytes(data[offset+1:offset+1+size]).decode('utf-8')
+  offset += 1 + size
+  dimRows, dimCols, blacks = SIZES.unpack_from(data, offset)
+  offset += SIZES.size
+  rows, cols = dimRows+1, dimCols+1
+  whites = rows*cols - blacks
+  nbytes = (rows*cols + 7) // 8
+  need(nbytes + 2*blacks + (whites+1)//2)
+  bitmap = bytearray(data[offset:offset+nbytes])
+  offset += nbytes
+  clueBytes = bytearray(data[offset:offset+2*blacks])
+  offset += 2*blacks
+  digits = bytearray(data[offset:offset + (whites+1)//2])
+
+  clues, solution = {}, {}
+  nb = nw = 0
+  for r in range(rows):
+    for c in range(cols):
+      k = r*cols + c
+      if bitmap[k >> 3] >> (k & 7) & 1:
+        clues[r, c] = (clueBytes[2*nb], clueBytes[2*nb+1])
+        nb += 1
+      else:
+        d = digits[nw >> 1] >> (4 * (nw & 1)) & 0xf
+        if d:
+          solution[r, c] = d
+        nw += 1
+  puzzle = KroPuzzle(dimRows, dimCols, clues, solution)
+  for r, c, direction, clue in strayClues(puzzle):
+    raise ArchiveError('%s clue %d at row %d, column %d has no run' %
+                       (direction, clue, r, c))
+  return name, puzzle
+
+def writeArchive(fname, puzzles):
+  # puzzles is a list of (name, puzzle) pairs; puzzle ids are their
+  # positions in the list
+
+  records = [packPuzzle(puzzle, name) for name, puzzle in puzzles]
+  offset = HEADER.size + ENTRY.size * len(records)
+  with open(fname, 'wb') as fout:
+    fout.write(HEADER.pack(MAGIC, VERSION, 0, len(records)))
+    for record in records:
+      fout.write(ENTRY.pack(offset, len(record)))
+      offset += len(record)
+    for record in records:
+      fout.write(record)
+
+class Archive(object):
+  # Read-only, random access to the puzzles of an archive file.
+  #   archive[id] is the (name, puzzle) pair of puzzle number id
+  # Use as a context manager, or call close() when done.
+
+  def __init__(self, fname):
+    self.fname = fname
+    self.fin = open(fname, 'rb')
+    try:
+      self.data = mmap.mmap(self.fin.fileno(), 0, access = mmap.ACCESS_READ)
+    except ValueError:                          # empty file
+      self.fin.close()
+      raise ArchiveError('%s: not a puzzle archive' % fname)
+    if len(self.data) < HEADER.size:
+      self.close()
+      raise ArchiveError('%s: not a puzzle archive' % fname)
+    magic, version, reserved, self.count = HEADER.unpack_from(self.data, 0)
+    if magic != MAGIC or version != VERSION:
+      self.close()
+      raise ArchiveError('%s: not a puzzle archive' % fname)
+    if len(self.data) < HEADER.size + ENTRY.size * self.count:
+      self.close()
+      raise ArchiveError('%s: truncated index' % fname)
+
+  def __len__(self):
+    return self.count
+
+  def __getitem__(self, id):
+    if not 0 <= id < self.count:
+      raise IndexError('puzzle id out of range')
+    offset, length = ENTRY.unpack_from(self.data, HEADER.size + ENTRY.size*id)
+    if offset + length > len(self.data):
+      raise ArchiveError('%s: puzzle %d is truncated' % (self.fname, id))
+    try:
+      return unpackPuzzle(self.data, offset, offset + length)
+    except ArchiveError as x:
+      raise ArchiveError('%s: puzzle %d: %s' % (self.fname, id, x))
+
+  def __iter__(self):
+    for id in range(self.count):
+      yield self[id]
+
+  def close(self):
+    self.data.close()
+    self.fin.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+def packFiles(fname, kroFiles):
+  # Convert .kro files to an archive.  Puzzles are named by file name, so
+  # two files of the same name, in different directories, can't be packed
+  # together.
+
+  names = {}
+  for f in kroFiles:
+    name = os.path.basename(f)
+    if name in names:
+      raise ArchiveError('%s and %s would both be packed as %s' %
+                         (names[name], f, name))
+    names[name] = f
+  puzzles = [(os.path.basename(f), readKro(f)) for f in kroFiles]
+  writeArchive(fname, puzzles)
+  return len(puzzles)
+
+def unpackFiles(fname, directory):
+  # Convert an archive back to .kro files in directory.  Puzzles without a
+  # name are called <id>.kro.  Only the last component of a name is used,
+  # so no file is written outside directory, and two puzzles that would be
+  # written to the same file are refused before anything is written.
+
+  count = 0
+  with Archive(fname) as archive:
+    names, ids = [], {}
+    for id, (name, puzzle) in enumerate(archive):
+      if name:
+        name = os.path.basename(name)
+        if name in ('', '.', '..'):
+          raise ArchiveError('%s: puzzle %d has no file name' % (fname, id))
+      else:
+        name = '%d.kro' % id
+      if name in ids:
+        raise ArchiveError('%s: puzzles %d and %d are both named %s' %
+                           (fname, ids[name], id, name))
+      ids[name] = id
+      names.append(name)
+    for name, (label, puzzle) in zip(names, archive):
+      with open(os.path.join(directory, name), 'w') as fout:
+        writeKro(fout, puzzle, name)
+      count += 1
+  return count
+
+def main(argv = None):
+  from batch import puzzleFiles
+
+  parser = argparse.ArgumentParser(description = 'Binary puzzle archives')
+  commands = parser.add_subparsers(dest = 'command')
+  pack = commands.add_parser('pack', help = 'convert .kro files to an archive')
+  pack.add_argument('archive')
+  pack.add_argument('paths', nargs = '+')
+  unpack = commands.add_parser('unpack', help = 'convert an archive to .kro')
+  unpack.add_argument('archive')
+  unpack.add_argument('directory')
+  listing = commands.add_parser('list', help = 'list the puzzles in an archive')
+  listing.add_argument('archive')
+  args = parser.parse_args(argv)
+
+  try:
+    if args.command == 'pack':
+      print('%d puzzles packed' % packFiles(args.archive,
+                                            puzzleFiles(args.paths)))
+    elif args.command == 'unpack':
+      if not os.path.isdir(args.directory):
+        os.makedirs(args.directory)
+      print('%d puzzles unpacked' % unpackFiles(args.archive, args.directory))
+    elif args.command == 'list':
+      with Archive(args.archive) as archive:
+        for id, (name, puzzle) in enumerate(archive):
+          print('%6d  %-20s %d by %d' % (id, name, puzzle.rows, puzzle.cols))
+    else:
+      parser.print_help()
+  except (ArchiveError, KroError) as x:
+    sys.exit(str(x))
+
+if __name__ == '__main__':
+  main()
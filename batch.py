@@ -0,0 +1,269 @@
+# batch.py
+# Validate a library of .kro puzzles without the GUI.
+# Usage:
+#   python batch.py [-o results.jsonl] [-j jobs] [--timeout secs] [--stats]
+#                   [--cache file] [--batch n] [--dedup] path ...
+# Each path is a .kro file, a directory (all .kro files in it), a glob
+# pattern, or a binary archive (.kar, see archive.py), which stands for all
+# the puzzles in it.  One JSON object is written per puzzle, one per line, with the
+# outcome of the sanity check and the uniqueness check, and the time spent
+# in each step.
+# With -j, puzzles are solved by a pool of worker processes, handed out in
+# chunks of --chunksize files.  Results are written in file order unless
+# --unordered is given, in which case each is written as soon as it is done.
+# --timeout gives the solver a deadline for each puzzle; a puzzle that runs
+# past it is reported as timed out, with the search counters so far.
+# --stats adds the solver's full statistics for each puzzle (see engine.py).
+# --cache names a solve cache (see solvecache.py): puzzles found in it are
+# looked up rather than solved, and are marked cached in the results.
+# --batch n propagates the clues of n puzzles at a time together, with
+# NumPy if it is installed (see batchprop.py); only the puzzles the clues
+# don't settle are searched.  --timeout is then shared by the group, and
+# propagations counts the runs the batch revised as well as the search.
+# --dedup skips puzzles that are the same as an earlier one, turned or
+# reflected or not (see dedup.py); each is reported last, with status
+# duplicate and the file it duplicates.
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os.path
+import sqlite3
+import sys
+from timeit import default_timer as clock
+from kro import readKro, grid, KroError
+from archive import Archive, ArchiveError
+from runs import extractRuns
+from kakuroCSP import UNIQUE
+from solvecache import SolveCache, checkPuzzle, lookupCheck, storeCheck
+from batchprop import solveBatch
+
+def puzzleFiles(paths):
+  # Expand directories and glob patterns into a sorted list of .kro files
+
+  found = []
+  for path in paths:
+    if os.path.isdir(path):
+      found.extend(glob.glob(os.path.join(path, '*.kro')))
+    elif glob.has_magic(path):
+      found.extend(glob.glob(path))
+    else:
+      found.append(path)
+  return sorted(set(found))
+
+def puzzleSources(paths):
+  # The puzzles named by paths: a file name for each .kro file, and an
+  # (archive, id) pair for each puzzle in an archive
+
+  sources = []
+  for fname in puzzleFiles(paths):
+    if fname.endswith('.kar'):
+      with Archive(fname) as archive:
+        sources.extend((fname, id) for id in range(len(archive)))
+    else:
+      sources.append(fname)
+  return sources
+
+archives = {}           # archives opened by this process, by file name
+caches = {}             # solve caches opened by this process, by file name
+
+def loadPuzzle(source):
+  # Returns (label, puzzle) for a file name or (archive, id) pair
+
+  if isinstance(source, tuple):
+    fname, id = source
+    if fname not in archives:
+      archives[fname] = Archive(fname)
+    name, puzzle = archives[fname][id]
+    return '%s[%d] %s' % (fname, id, name), puzzle
+  return source, readKro(source)
+
+def openCache(cacheFile):
+  # The solve cache named cacheFile, opened once by each process, or None
+  # if cacheFile is None or the cache is locked by another process
+
+  if cacheFile is None:
+    return None
+  if cacheFile not in caches:
+    try:
+      caches[cacheFile] = SolveCache(cacheFile)
+    except sqlite3.OperationalError:
+      return None
+  return caches[cacheFile]
+
+def validate(source, timeout = None, withStats = False, cacheFile = None):
+  # Check one puzzle, allowing the solver timeout seconds.  source is as
+  # returned by puzzleSources.  If withStats is true, the search statistics
+  # are included.  cacheFile is the name of a solve cache, or None.
+  # Returns a dict suitable for json.dumps.
+
+  result, puzzle, model = prepare(source)
+  if model is None:
+    return result
+  start = clock()
+  deadline = None if timeout is None else start + timeout
+  record(result, puzzle, checkPuzzle(puzzle, openCache(cacheFile), deadline,
+                                     model = model), withStats)
+  result['solve'] = clock() - start
+  return result
+
+def validateGroup(sources, timeout = None, withStats = False,
+                  cacheFile = None):
+  # Check a group of puzzles, propagating the clues of those not in the
+  # cache together (see batchprop.py).  The group is allowed timeout
+  # seconds for each puzzle that needs solving.  Returns a list of results,
+  # as for validate.
+
+  prepared = [prepare(source) for source in sources]
+  cache = openCache(cacheFile)
+  pending = []
+  for result, puzzle, model in prepared:
+    if model is None:
+      continue
+    start = clock()
+    check = lookupCheck(puzzle, cache)
+    if check is None:
+      pending.append((result, puzzle, model))
+    else:
+      record(result, puzzle, check, withStats)
+      result['solve'] = clock() - start
+  deadline = None if timeout is None else clock() + timeout * len(pending)
+  solved = solveBatch([model for result, puzzle, model in pending], deadline)
+  for (result, puzzle, model), outcome in zip(pending, solved):
+    record(result, puzzle, storeCheck(puzzle, cache, outcome), withStats)
+    result['solve'] = outcome.stats['elapsed']
+  return [result for result, puzzle, model in prepared]
+
+def prepare(source):
+  # The steps of validate before the solve.  Returns (result, puzzle,
+  # model); model is None if the result is already complete, because the
+  # puzzle couldn't be read or has impossible clues.
+
+  result = {'file': source[0] if isinstance(source, tuple) else source}
+  start = clock()
+  try:
+    result['file'], puzzle = loadPuzzle(source)
+  except (IOError, OSError, KroError, ArchiveError) as x:
+    result['status'] = 'error'
+    result['error'] = str(x)
+    return result, None, None
+  parsed = clock()
+  result['parse'] = parsed - start
+
+  model = extractRuns(*grid(puzzle))
+  result['check'] = clock() - parsed
+  if model.contradictions:
+    result['status'] = 'impossible clues'
+    result['contradictions'] = model.contradictions
+    return result, puzzle, None
+  return result, puzzle, model
+
+def record(result, puzzle, check, withStats):
+  # Add a uniqueness check, as solvecache.checkPuzzle returns it, to result
+
+  status, count, solution, cached, stats = check
+  result['status'] = status
+  result['solutions'] = count
+  if cached:
+    result['cached'] = True
+  else:
+    result['nodes'] = stats['nodes']
+    result['propagations'] = stats['propagations']
+    if withStats:
+      result['stats'] = stats
+  if status == UNIQUE and puzzle.solution:
+    result['matchesFile'] = solution == puzzle.solution
+
+def validateJob(job):
+  # Worker function: job is (source, timeout, withStats, cacheFile)
+
+  return validate(*job)
+
+def validateGroupJob(job):
+  # Worker function: job is (sources, timeout, withStats, cacheFile)
+
+  return validateGroup(*job)
+
+def validateAll(sources, jobs = 1, chunksize = 1, ordered = True,
+                timeout = None, withStats = False, cacheFile = None,
+                batch = 0):
+  # Generate the results for the given puzzle sources, solving with jobs
+  # worker processes.  If batch is more than 1, puzzles are checked in
+  # groups of that many by validateGroup, and each group counts as one item
+  # of chunksize.
+
+  if batch > 1:
+    work = [(sources[k:k+batch], timeout, withStats, cacheFile)
+            for k in range(0, len(sources), batch)]
+    function = validateGroupJob
+  else:
+    work = [(source, timeout, withStats, cacheFile) for source in sources]
+    function = validateJob
+  if jobs == 1:
+    done = (function(job) for job in work)
+  else:
+    pool = multiprocessing.Pool(jobs)
+    results = pool.imap if ordered else pool.imap_unordered
+    done = results(function, work, chunksize)
+  try:
+    for result in done:
+      if batch > 1:
+        for item in result:
+          yield item
+      else:
+        yield result
+    if jobs != 1:
+      pool.close()
+  finally:
+    if jobs != 1:
+      pool.terminate()
+      pool.join()
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = 'Validate .kro puzzles')
+  parser.add_argument('paths', nargs = '+',
+                      help = '.kro files, archives, directories or globs')
+  parser.add_argument('-o', '--output', help = 'write results to this file')
+  parser.add_argument('-j', '--jobs', type = int, default = 1,
+                      help = 'number of worker processes (0 for one per CPU)')
+  parser.add_argument('--chunksize', type = int, default = 4,
+                      help = 'files handed to a worker at a time')
+  parser.add_argument('--unordered', action = 'store_true',
+                      help = 'write results as they finish')
+  parser.add_argument('--timeout', type = float,
+                      help = 'seconds allowed per puzzle')
+  parser.add_argument('--stats', action = 'store_true',
+                      help = 'include the search statistics')
+  parser.add_argument('--cache', help = 'solve cache file')
+  parser.add_argument('--batch', type = int, default = 0,
+                      help = 'puzzles propagated together (see batchprop.py)')
+  parser.add_argument('--dedup', action = 'store_true',
+                      help = 'skip puzzles that duplicate earlier ones')
+  args = parser.parse_args(argv)
+  jobs = args.jobs or multiprocessing.cpu_count()
+
+  sources = puzzleSources(args.paths)
+  duplicates = []
+  if args.dedup:
+    from dedup import uniqueSources
+    sources, duplicates = uniqueSources(sources)
+  fout = open(args.output, 'w') if args.output else sys.stdout
+  try:
+    for result in validateAll(sources, jobs, args.chunksize,
+                              not args.unordered, args.timeout, args.stats,
+                              args.cache, args.batch):
+      fout.write(json.dumps(result, sort_keys = True) + '\n')
+      fout.flush()
+    for label, original in duplicates:
+      result = {'file': label, 'status': 'duplicate', 'duplicateOf': original}
+      fout.write(json.dumps(result, sort_keys = True) + '\n')
+  finally:
+    if fout is not sys.stdout:
+      fout.close()
+    for cache in caches.values():
+      cache.close()
+    caches.clear()
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,167 @@
+# batchprop.py
+# Propagate the clues of many puzzles at once, for validating large
+# libraries of small puzzles.  The candidates of every white square of
+# every puzzle are stacked in one NumPy array, and the runs of every puzzle
+# in an array of the squares they hold, padded to 9, with another of their
+# combinations, padded to the most any run has.  Each pass revises every
+# run of every puzzle together, by the rules of Engine.reviseRun (see
+# engine.py), and the passes go on until nothing changes.  A square in two
+# runs keeps the candidates both revisions allow.
+# Puzzles the clues settle, or show to be impossible, are done; only the
+# rest are searched, by an Engine starting from the candidates the batch
+# left them.
+# Without NumPy, each puzzle is propagated by its own engine instead.
+
+from array import array
+from timeit import default_timer as clock
+from candidates import ALL, POPCOUNT, DIGITS
+from combos import lookup
+from engine import Engine, emptyStats
+from kakuroCSP import SolveResult, outcome
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+def stack(models):
+  # The arrays for the kernel: (candidates, runCells, valid, across,
+  # combos, runPuzzle, cellPuzzle, offsets).  runCells index candidates,
+  # valid says which entries are real squares, and across which runs are
+  # across runs; the padding points at an extra entry at the end of
+  # candidates.
+
+  offsets = [0]
+  for model in models:
+    offsets.append(offsets[-1] + len(model.cells))
+  total = offsets[-1]
+  runs = [(offset, run, lookup(run.clue, len(run.cells)).masks)
+          for offset, model in zip(offsets, models) for run in model.runs]
+  width = max([len(masks) for offset, run, masks in runs] + [1])
+  runCells = np.full((len(runs), 9), total, np.intp)
+  combos = np.zeros((len(runs), width), np.int32)
+  for k, (offset, run, masks) in enumerate(runs):
+    runCells[k, :len(run.cells)] = [offset + c for c in run.cells]
+    combos[k, :len(masks)] = masks
+  runPuzzle = np.searchsorted(offsets, [offset for offset, run, masks in runs],
+                              side = 'right') - 1
+  cellPuzzle = np.searchsorted(offsets, np.arange(total), side = 'right') - 1
+  valid = runCells < total
+  across = np.array([run.direction == 'across' for offset, run, masks in runs],
+                    bool)
+  candidates = np.full(total + 1, ALL, np.int32)
+  return (candidates, runCells, valid, across, combos, runPuzzle, cellPuzzle,
+          offsets)
+
+def revise(candidates, runCells, valid, across, combos, popcount):
+  # One pass over the given runs.  Returns (candidates, failed), the new
+  # candidates and which runs can no longer be filled.
+
+  cands = np.where(valid, candidates[runCells], 0)
+
+  # A combination survives if every square can take one of its digits, and
+  # every one of its digits can go in some square
+
+  hit = cands[:, None, :] & combos[:, :, None]
+  every = ((hit != 0) | ~valid[:, None, :]).all(axis = 2)
+  cover = np.bitwise_or.reduce(hit, axis = 2)
+  alive = every & (cover == combos) & (combos != 0)
+  allowed = np.bitwise_or.reduce(np.where(alive, combos, 0), axis = 1)
+  must = np.bitwise_and.reduce(np.where(alive, combos, ALL), axis = 1)
+  new = cands & allowed[:, None]
+
+  # Digits already placed cannot appear elsewhere in the run
+
+  single = valid & (popcount[new] == 1)
+  placed = np.bitwise_or.reduce(np.where(single, new, 0), axis = 1)
+  failed = (allowed == 0) | (popcount[placed] != single.sum(axis = 1))
+  new = np.where(single, new, new & ~placed[:, None])
+
+  # A digit every surviving combination needs, which only one square can
+  # hold, must go in that square
+
+  for d in range(9):
+    b = 1 << d
+    holds = (new & b) != 0
+    count = holds.sum(axis = 1)
+    needed = ((must & ~placed) & b) != 0
+    failed |= needed & (count == 0)
+    fix = needed & (count == 1)
+    new = np.where(fix[:, None] & holds, b, new)
+
+  # A square is in at most one across run and one down run, so each half
+  # can be stored without repeated indices
+
+  result = candidates.copy()
+  for half in (across, ~across):
+    cells, masks = runCells[half], new[half]
+    result[cells] &= np.where(valid[half], masks, ALL)
+  return result, failed
+
+def propagateBatch(models):
+  # The candidates of each puzzle after propagating its clues, as
+  # Engine.reduced returns them: an array('H') for each RunModel in models,
+  # or None if its clues are contradictory
+
+  return propagateCounted(models)[0]
+
+def propagateCounted(models):
+  # Returns (reduced, revisions): the candidates of each puzzle, as for
+  # propagateBatch, and the number of its runs that were revised, which is
+  # what Engine.propagations counts.  The kernel revises every run through
+  # a changed square on each pass, so the counts differ from an engine's.
+
+  if np is None or not models:
+    engines = [Engine(model) for model in models]
+    reduced = [engine.reduced() for engine in engines]
+    return reduced, [engine.propagations for engine in engines]
+  (candidates, runCells, valid, across, combos, runPuzzle, cellPuzzle,
+   offsets) = stack(models)
+  popcount = np.frombuffer(bytes(POPCOUNT), np.uint8)
+  failed = np.zeros(len(models), bool)
+  revisions = np.zeros(len(models), np.int64)
+
+  # Each pass revises the runs through the squares the last pass changed,
+  # leaving out puzzles already found contradictory
+
+  active = np.arange(len(runCells))
+  while len(active):
+    revisions += np.bincount(runPuzzle[active], minlength = len(models))
+    new, broken = revise(candidates, runCells[active], valid[active],
+                         across[active], combos[active], popcount)
+    failed[runPuzzle[active[broken]]] = True
+    changed = new != candidates
+    failed[cellPuzzle[changed[:-1] & (new[:-1] == 0)]] = True
+    candidates = new
+    touched = (changed[runCells] & valid).any(axis = 1)
+    active = np.flatnonzero(touched & ~failed[runPuzzle])
+  reduced = [None if failed[p] else
+             array('H', candidates[offsets[p]:offsets[p+1]].tolist())
+             for p in range(len(models))]
+  return reduced, [int(n) for n in revisions]
+
+def solveBatch(models, deadline = None, cancel = None):
+  # Check each RunModel in models for uniqueness, as kakuroCSP.solve does.
+  # Returns a list of SolveResults.  The elapsed time of each includes an
+  # equal share of the batch propagation, and its propagations the runs the
+  # batch revised as well as those the search did.
+
+  start = clock()
+  reduced, revisions = propagateCounted(models)
+  share = (clock() - start) / max(1, len(models))
+  results = []
+  for model, candidates, revised in zip(models, reduced, revisions):
+    begun = clock()
+    if candidates is None:
+      solutions, stats, stoppedBy = [], emptyStats(), None
+    elif all(POPCOUNT[m] == 1 for m in candidates):
+      solutions = [{v: DIGITS[m][0] for v, m in zip(model.cells, candidates)}]
+      stats, stoppedBy = emptyStats(), None
+    else:
+      engine = Engine(model)
+      solutions = engine.search(candidates, 2, deadline, cancel)
+      stats, stoppedBy = engine.statistics(), engine.stoppedBy
+    stats['propagations'] += revised
+    stats['elapsed'] = share + clock() - begun
+    results.append(SolveResult(outcome(stoppedBy, len(solutions)),
+                               solutions, stats))
+  return results
@@ -0,0 +1,382 @@
+# benchmark.py
+# Timing and regression checks for the solver.
+# Usage:
+#   python benchmark.py suite [--repeat n] [--tile k] [-o results.json] path ...
+#   python benchmark.py compare [--threshold t] old.json new.json
+#   python benchmark.py strategies [--order mrv,run,combos]
+#                                  [--values ascending,...] [--repeat n] path ...
+#   python benchmark.py backends [--repeat n] path ...
+# Paths are as for batch.py.
+#
+# suite times each step of checking a puzzle separately -- parsing the .kro
+# text, the sanity check, propagating the clues and searching the propagated
+# candidates for a second solution --
+# over --repeat runs, and reports the median and 95th percentile of each,
+# with the peak memory allocated by one run, as tracemalloc measures it.
+# Without tracemalloc (python 2), the growth in the peak resident set size
+# of a fresh process checking the puzzle is reported instead.
+# With --tile k, each puzzle is also run as a large grid of k by k copies of
+# itself.  The copies share no runs, so a tiled grid is k*k separate
+# puzzles, not one large connected one: it measures how the steps scale
+# with the number of squares, but the solve step, which searches each region
+# on its own as kakuroCSP.solve does, finds it no harder than k*k checks of
+# the puzzle itself.  Results can be saved as JSON with -o.
+#
+# compare reads two saved suites and flags every timing that got slower by
+# more than the threshold, a fraction of the old time.  It exits with status
+# 1 if there are any, so it can be used in scripts.
+#
+# strategies checks each puzzle for uniqueness with every combination of
+# variable and value order, and prints the nodes searched and best wall
+# time of --repeat runs, with totals per strategy.
+#
+# backends checks each puzzle for uniqueness with each search backend of
+# kakuroCSP.solve, and reports the faster backend for each class of puzzle.
+# Puzzles are classed by size, and by whether propagating the clues solves
+# them outright or the check has to search.
+
+import argparse
+import json
+import multiprocessing
+import sys
+from array import array
+from timeit import default_timer as clock
+from kro import KroPuzzle, loadKro, readKro, writeKro, grid
+from runs import extractRuns
+from engine import Engine, VARIABLE_ORDERS, VALUE_ORDERS
+from kakuroCSP import solve, BACKENDS
+from decompose import neighbours, components, subModel
+from batch import puzzleFiles
+try:
+  from StringIO import StringIO
+except ImportError:
+  from io import StringIO
+try:
+  import tracemalloc
+except ImportError:                             # python 2
+  tracemalloc = None
+try:
+  import resource
+except ImportError:                             # Windows
+  resource = None
+
+STEPS = ('parse', 'check', 'propagate', 'solve')
+THRESHOLD = 0.25        # default slowdown flagged by compare
+NOISE = 0.0005          # seconds; smaller differences are never flagged
+
+def tiled(puzzle, k):
+  # A k by k grid of copies of puzzle.  Each copy keeps its clue row and
+  # column, which end the runs of the copies above and to the left of it.
+
+  height, width = puzzle.rows+1, puzzle.cols+1
+  clues, solution = {}, {}
+  for i in range(k):
+    for j in range(k):
+      for (r, c), v in puzzle.clues.items():
+        clues[i*height + r, j*width + c] = v
+      for (r, c), v in puzzle.solution.items():
+        solution[i*height + r, j*width + c] = v
+  return KroPuzzle(k*height - 1, k*width - 1, clues, solution)
+
+def kroText(puzzle, name):
+  fout = StringIO()
+  writeKro(fout, puzzle, name)
+  return fout.getvalue()
+
+def percentile(samples, p):
+  # Nearest-rank percentile of a list of numbers
+
+  ordered = sorted(samples)
+  rank = max(0, int(-(-p * len(ordered) // 100)) - 1)
+  return ordered[rank]
+
+def searchRegions(model, candidates):
+  # Check for a second solution from propagated candidates, searching each
+  # independent region on its own as kakuroCSP.solve does.  A region's
+  # candidates are already propagated, since its runs lie wholly inside it.
+  # Returns the number of solutions, at most 2.
+
+  count = 1
+  for part in components(neighbours(model), range(len(model.cells))):
+    engine = Engine(subModel(model, part))
+    count *= len(engine.search(array('H', [candidates[c] for c in part]), 2))
+    if count != 1:
+      break
+  return min(count, 2)
+
+def timeSteps(text):
+  # Returns a dict mapping each of STEPS to its time in seconds, for one
+  # run through the checks of a puzzle given as .kro text.  The solve step
+  # searches from the candidates already propagated, so propagating the
+  # clues is timed only once.
+
+  times = {}
+  start = clock()
+  puzzle = loadKro(StringIO(text))
+  parsed = clock()
+  model = extractRuns(*grid(puzzle))
+  checked = clock()
+  candidates = Engine(model).reduced()
+  propagated = clock()
+  if candidates is not None:
+    searchRegions(model, candidates)
+  finished = clock()
+  times['parse'] = parsed - start
+  times['check'] = checked - parsed
+  times['propagate'] = propagated - checked
+  times['solve'] = finished - propagated
+  return times
+
+def rssGrowth(text):
+  # Worker function: how many bytes checking the puzzle raised the peak
+  # resident set size of this process by
+
+  before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  timeSteps(text)
+  after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return (after - before) * (1 if sys.platform == 'darwin' else 1024)
+
+def peakMemory(text):
+  # Peak bytes allocated while checking the puzzle.  Without tracemalloc,
+  # the puzzle is checked in a new process, whose peak resident set size
+  # is measured by rssGrowth.  Returns None if neither is available.
+
+  if tracemalloc is None:
+    if resource is None:
+      return None
+    pool = multiprocessing.Pool(1)
+    try:
+      return pool.apply(rssGrowth, (text,))
+    finally:
+      pool.terminate()
+      pool.join()
+  tracemalloc.start()
+  try:
+    timeSteps(text)
+    return tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+def benchmarkPuzzle(text, repeat):
+  samples = [timeSteps(text) for k in range(repeat)]
+  result = {}
+  for step in STEPS:
+    times = [s[step] for s in samples]
+    result[step] = {'median': percentile(times, 50),
+                    'p95': percentile(times, 95)}
+  result['peakMemory'] = peakMemory(text)
+  return result
+
+def runSuite(fnames, repeat = 5, tile = 0):
+  # Returns a dict mapping puzzle names to their results.  Tiled puzzles
+  # are named like 'docs/one.kro x4'.
+
+  texts = []
+  for fname in fnames:
+    with open(fname) as fin:
+      texts.append((fname, fin.read()))
+    if tile > 1:
+      name = '%s x%d' % (fname, tile)
+      texts.append((name, kroText(tiled(readKro(fname), tile), name)))
+  return {name: benchmarkPuzzle(text, repeat) for name, text in texts}
+
+def printSuite(suite):
+  tiles = sorted({name.rsplit(' x', 1)[1] for name in suite if ' x' in name})
+  print('%-28s %-10s %10s %10s' % ('puzzle', 'step', 'median ms', 'p95 ms'))
+  for name in sorted(suite):
+    result = suite[name]
+    for step in STEPS:
+      print('%-28s %-10s %10.3f %10.3f' % (name[-28:], step,
+                                           1000*result[step]['median'],
+                                           1000*result[step]['p95']))
+    if result['peakMemory'] is not None:
+      print('%-28s %-10s %10.1f KB' % ('', 'memory',
+                                       result['peakMemory'] / 1024.0))
+  for k in tiles:
+    print('x%s: %s by %s disconnected copies of the puzzle, with no runs '
+          'in common' % (k, k, k))
+
+def compareSuites(old, new, threshold = THRESHOLD):
+  # Returns a list of (puzzle, step, old, new) for every median time that
+  # is more than threshold slower in new than in old.  Puzzles missing
+  # from either suite are ignored.
+
+  slower = []
+  for name in sorted(set(old) & set(new)):
+    for step in STEPS:
+      before = old[name][step]['median']
+      after = new[name][step]['median']
+      if after - before > max(threshold * before, NOISE):
+        slower.append((name, step, before, after))
+  return slower
+
+def timeStrategy(model, order, values, repeat = 1):
+  # Returns (nodes, seconds) for a uniqueness check of model, seconds being
+  # the best of repeat runs
+
+  best = None
+  for k in range(repeat):
+    engine = Engine(model, order, values)
+    start = clock()
+    engine.solve(2)
+    elapsed = clock() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return engine.nodes, best
+
+def compareStrategies(fnames, orders = VARIABLE_ORDERS, values = VALUE_ORDERS,
+                      repeat = 1):
+  # Returns a list of (file, order, values, nodes, seconds), in file order
+
+  results = []
+  for fname in fnames:
+    model = extractRuns(*grid(readKro(fname)))
+    if model.contradictions:
+      continue
+    for order in orders:
+      for value in values:
+        nodes, seconds = timeStrategy(model, order, value, repeat)
+        results.append((fname, order, value, nodes, seconds))
+  return results
+
+def report(results):
+  totals = {}
+  print('%-24s %-8s %-10s %10s %10s' % ('puzzle', 'order', 'values',
+                                        'nodes', 'ms'))
+  for fname, order, value, nodes, seconds in results:
+    print('%-24s %-8s %-10s %10d %10.2f' % (fname[-24:], order, value,
+                                            nodes, 1000*seconds))
+    total = totals.setdefault((order, value), [0, 0.0])
+    total[0] += nodes
+    total[1] += seconds
+  print('')
+  for (order, value), (nodes, seconds) in sorted(totals.items(),
+                                                 key = lambda t: t[1][1]):
+    print('%-24s %-8s %-10s %10d %10.2f' % ('total', order, value,
+                                            nodes, 1000*seconds))
+
+# Size classes: the most white squares in each, the last having no limit
+
+SIZES = ((60, 'small'), (150, 'medium'), (None, 'large'))
+
+def puzzleClass(model):
+  # The class of a puzzle, such as 'medium/search'
+
+  for limit, size in SIZES:
+    if limit is None or len(model.cells) <= limit:
+      break
+  candidates = Engine(model).reduced()
+  if candidates is not None and all(m & (m-1) == 0 for m in candidates):
+    return size + '/propagation'
+  return size + '/search'
+
+def timeBackend(model, backend, repeat = 1):
+  # Returns (nodes, seconds) for a uniqueness check of model with backend,
+  # seconds being the best of repeat runs
+
+  best = None
+  for k in range(repeat):
+    status, solutions, stats = solve(model, backend = backend)
+    if best is None or stats['elapsed'] < best:
+      best = stats['elapsed']
+  return stats['nodes'], best
+
+def compareBackends(fnames, backends = BACKENDS, repeat = 1):
+  # Returns a list of (file, class, backend, nodes, seconds), in file order
+
+  results = []
+  for fname in fnames:
+    model = extractRuns(*grid(readKro(fname)))
+    if model.contradictions:
+      continue
+    kind = puzzleClass(model)
+    for backend in backends:
+      nodes, seconds = timeBackend(model, backend, repeat)
+      results.append((fname, kind, backend, nodes, seconds))
+  return results
+
+def fastestBackends(results):
+  # Maps each puzzle class to (backend, seconds), the backend with the
+  # least total time over the puzzles of the class
+
+  totals = {}
+  for fname, kind, backend, nodes, seconds in results:
+    byBackend = totals.setdefault(kind, {})
+    byBackend[backend] = byBackend.get(backend, 0.0) + seconds
+  return {kind: min(byBackend.items(), key = lambda t: t[1])
+          for kind, byBackend in totals.items()}
+
+def reportBackends(results):
+  print('%-24s %-18s %-8s %10s %10s' % ('puzzle', 'class', 'backend',
+                                        'nodes', 'ms'))
+  for fname, kind, backend, nodes, seconds in results:
+    print('%-24s %-18s %-8s %10d %10.2f' % (fname[-24:], kind, backend,
+                                            nodes, 1000*seconds))
+  print('')
+  for kind, (backend, seconds) in sorted(fastestBackends(results).items()):
+    print('%-24s %-18s %-8s %10s %10.2f' % ('fastest', kind, backend, '',
+                                            1000*seconds))
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = 'Solver benchmarks')
+  commands = parser.add_subparsers(dest = 'command')
+  suite = commands.add_parser('suite', help = 'time each step of a check')
+  suite.add_argument('paths', nargs = '+',
+                     help = '.kro files, directories or globs')
+  suite.add_argument('--repeat', type = int, default = 5,
+                     help = 'runs per puzzle')
+  suite.add_argument('--tile', type = int, default = 0,
+                     help = 'also run each puzzle tiled k by k')
+  suite.add_argument('-o', '--output', help = 'save the results as JSON')
+  compare = commands.add_parser('compare', help = 'compare two saved suites')
+  compare.add_argument('old')
+  compare.add_argument('new')
+  compare.add_argument('--threshold', type = float, default = THRESHOLD,
+                       help = 'slowdown flagged, as a fraction of the old time')
+  strategies = commands.add_parser('strategies',
+                                   help = 'compare search strategies')
+  strategies.add_argument('paths', nargs = '+',
+                          help = '.kro files, directories or globs')
+  strategies.add_argument('--order', default = ','.join(VARIABLE_ORDERS),
+                          help = 'variable orders to try, separated by commas')
+  strategies.add_argument('--values', default = ','.join(VALUE_ORDERS),
+                          help = 'value orders to try, separated by commas')
+  strategies.add_argument('--repeat', type = int, default = 3,
+                          help = 'runs per strategy; the best time is reported')
+  backends = commands.add_parser('backends',
+                                 help = 'compare search backends')
+  backends.add_argument('paths', nargs = '+',
+                        help = '.kro files, directories or globs')
+  backends.add_argument('--repeat', type = int, default = 3,
+                        help = 'runs per backend; the best time is reported')
+  args = parser.parse_args(argv)
+
+  if args.command == 'suite':
+    results = runSuite(puzzleFiles(args.paths), args.repeat, args.tile)
+    printSuite(results)
+    if args.output:
+      with open(args.output, 'w') as fout:
+        json.dump(results, fout, indent = 1, sort_keys = True)
+  elif args.command == 'compare':
+    with open(args.old) as fin:
+      old = json.load(fin)
+    with open(args.new) as fin:
+      new = json.load(fin)
+    slower = compareSuites(old, new, args.threshold)
+    for name, step, before, after in slower:
+      print('%-28s %-10s %10.3f -> %.3f ms' % (name[-28:], step,
+                                                1000*before, 1000*after))
+    print('%d regressions' % len(slower))
+    if slower:
+      sys.exit(1)
+  elif args.command == 'strategies':
+    report(compareStrategies(puzzleFiles(args.paths), args.order.split(','),
+                             args.values.split(','), args.repeat))
+  elif args.command == 'backends':
+    reportBackends(compareBackends(puzzleFiles(args.paths),
+                                   repeat = args.repeat))
+  else:
+    parser.print_help()
+
+if __name__ == '__main__':
+  main()
@@ -109,18 +109,24 @@ class Board(ScrolledCanvas):
     self.reset(width, rows, cols)
 
   def displayClues(self, clues):
+    # clues maps the coords of each black square to its (across, down)
+    # clues, as in kro.KroPuzzle.  The old form, a sequence of
+    # 'Row Col Acr Dwn' lines of a .kro file, is still accepted.
+
+    if not hasattr(clues, 'items'):
+      clues = dict(((int(f[0]), int(f[1])), (int(f[2]), int(f[3])))
+                   for f in (clue.split() for clue in clues))
     canvas = self.canvas
-    for clue in clues:
-      row, col, across, down = clue.split()
+    for (row, col), (across, down) in clues.items():
       aTag = 'clueR%sC%sA' % (row, col)
       dTag = 'clueR%sC%sD' % (row, col)
       coords = '%s.%s' % (row, col)
       cell = canvas.find_withtag(coords)
       canvas.addtag_withtag('black', coords)
-      if across != '0':
-        canvas.itemconfigure(aTag, text = across)
-      if down != '0':
-        canvas.itemconfigure(dTag, text = down)
+      if across:
+        canvas.itemconfigure(aTag, text = str(across))
+      if down:
+        canvas.itemconfigure(dTag, text = str(down))
     canvas.itemconfigure('black', fill = blackFill)
 
   def unhighlight(self):
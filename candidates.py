@@ -0,0 +1,54 @@
+# candidates.py
+# Compact candidate sets, shared by the solver and the player.
+# The candidates of a white square are a 9-bit mask, with bit d-1 set when
+# the digit d is still possible.  The candidates of a whole board are held
+# in an array of unsigned shorts, indexed by cell number, so intersection
+# and elimination are single integer operations and copying the board for
+# a search branch is one array copy.
+
+from array import array
+
+ALL = 0x1ff                 # every digit from 1 to 9
+
+# Lookup tables over all 512 masks
+
+POPCOUNT = bytearray(512)
+DIGITS = [()] * 512
+for _m in range(1, 512):
+  POPCOUNT[_m] = POPCOUNT[_m & (_m-1)] + 1
+  DIGITS[_m] = tuple(d for d in range(1, 10) if _m & (1 << (d-1)))
+del _m
+
+def bit(digit):
+  return 1 << (digit-1)
+
+def popcount(mask):
+  # Number of candidates in mask
+
+  return POPCOUNT[mask]
+
+def lowestBit(mask):
+  # The mask of the smallest candidate in mask
+
+  return mask & -mask
+
+def lowestDigit(mask):
+  # The smallest candidate in mask, or 0 if mask is empty
+
+  return DIGITS[mask & -mask][0] if mask else 0
+
+def digits(mask):
+  # The candidates in mask, as a tuple of digits in increasing order
+
+  return DIGITS[mask]
+
+def fromDigits(values):
+  mask = 0
+  for d in values:
+    mask |= 1 << (d-1)
+  return mask
+
+def candidateArray(size, mask = ALL):
+  # Candidates for size cells, each initially mask
+
+  return array('H', [mask]) * size
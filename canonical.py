@@ -0,0 +1,128 @@
+# canonical.py
+# Canonical forms of puzzles, so the same puzzle is recognised however it
+# was saved: transposed (as savePuzzleKro does to boards with more rows
+# than columns), turned or reflected.  Such a puzzle is the same puzzle,
+# with each clue moved to the new start of its run.
+#
+# A symmetry is a triple (transposed, flipRows, flipCols): the rows are
+# reversed if flipRows is true, then the columns if flipCols is, then the
+# board is transposed if transposed is.  The eight triples are the
+# rotations and reflections of the board.  The canonical form of a puzzle
+# is the least of its eight forms written out as text, and its fingerprint
+# a hash of the canonical form.  Its layout key is a hash of the least of
+# the eight forms of its pattern of black and white squares, clues left
+# out.
+
+import hashlib
+from kro import KroPuzzle
+
+SYMMETRIES = [(t, fr, fc) for t in (False, True) for fr in (False, True)
+              for fc in (False, True)]
+
+def serialize(puzzle):
+  # The dimensions and clues of a puzzle as text.  The solution is left
+  # out, since it follows from the clues.
+
+  lines = ['%d %d' % (puzzle.rows, puzzle.cols)]
+  for (r, c) in sorted(puzzle.clues):
+    a, d = puzzle.clues[r, c]
+    lines.append('%d %d %d %d' % (r, c, a, d))
+  return '\n'.join(lines)
+
+def mapCoords(coords, symmetry, rows, cols):
+  # Where the white square coords of a puzzle with the given dimensions
+  # goes under symmetry
+
+  transposed, flipRows, flipCols = symmetry
+  r, c = coords
+  if flipRows:
+    r = rows + 1 - r
+  if flipCols:
+    c = cols + 1 - c
+  return (c, r) if transposed else (r, c)
+
+def restoreCoords(coords, symmetry, rows, cols):
+  # The inverse of mapCoords: where the white square at coords of the
+  # transformed puzzle came from
+
+  transposed, flipRows, flipCols = symmetry
+  r, c = (coords[1], coords[0]) if transposed else coords
+  if flipRows:
+    r = rows + 1 - r
+  if flipCols:
+    c = cols + 1 - c
+  return r, c
+
+def whiteSquares(puzzle):
+  # The coords of the white squares: every square of the board but the
+  # black squares, which are all listed in the clues
+
+  return {(r, c) for r in range(1, puzzle.rows+1)
+          for c in range(1, puzzle.cols+1)} - set(puzzle.clues)
+
+def transform(puzzle, symmetry):
+  # The kro.KroPuzzle under symmetry.  Each run keeps its clue, which moves
+  # to the black square before the new start of the run.  A clue with no run
+  # (kro.strayClues) has nowhere to go, and raises ValueError rather than
+  # being dropped, which would give two puzzles the same fingerprint.
+
+  whites = whiteSquares(puzzle)
+  move = lambda coords: mapCoords(coords, symmetry, puzzle.rows, puzzle.cols)
+  rows, cols = puzzle.rows, puzzle.cols
+  if symmetry[0]:
+    rows, cols = cols, rows
+  moved = set(map(move, whites))
+  clues = {(r, c): [0, 0] for r in range(rows+1) for c in range(cols+1)
+           if (r, c) not in moved}
+  for (r, c), (a, d) in puzzle.clues.items():
+    for k, clue, step in ((0, a, (0, 1)), (1, d, (1, 0))):
+      cells = []
+      white = (r + step[0], c + step[1])
+      while white in whites:
+        cells.append(move(white))
+        white = (white[0] + step[0], white[1] + step[1])
+      if not cells:
+        if clue:
+          raise ValueError('clue %d at %s has no run' % (clue, (r, c)))
+        continue
+      first = min(cells)
+      if k == symmetry[0]:          # an across run, after the transform
+        clues[first[0], first[1]-1][0] = clue
+      else:
+        clues[first[0]-1, first[1]][1] = clue
+  solution = {move(coords): v for coords, v in puzzle.solution.items()}
+  return KroPuzzle(rows, cols, {b: tuple(v) for b, v in clues.items()},
+                   solution)
+
+def canonicalForm(puzzle):
+  # Returns (text, symmetry): the least serialized form of puzzle under
+  # any symmetry, and the first symmetry giving it
+
+  return min((serialize(transform(puzzle, symmetry)), symmetry)
+             for symmetry in SYMMETRIES)
+
+def fingerprint(puzzle):
+  # Returns (key, symmetry), key being a hex digest of the canonical form
+  # under every symmetry
+
+  text, symmetry = canonicalForm(puzzle)
+  return hashlib.sha1(text.encode('ascii')).hexdigest(), symmetry
+
+def layout(puzzle):
+  # The pattern of black and white squares as text, a line per row
+
+  whites = whiteSquares(puzzle)
+  return '\n'.join(''.join('.' if (r, c) in whites else '#'
+                           for c in range(puzzle.cols+1))
+                   for r in range(puzzle.rows+1))
+
+def layoutKey(puzzle):
+  # Returns (key, symmetries): a hex digest of the least layout of puzzle
+  # under any symmetry, and the symmetries that give it, more than one if
+  # the layout is symmetric
+
+  forms = {}
+  for symmetry in SYMMETRIES:
+    forms.setdefault(layout(transform(puzzle, symmetry)), []).append(symmetry)
+  text = min(forms)
+  return hashlib.sha1(text.encode('ascii')).hexdigest(), forms[text]
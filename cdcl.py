@@ -0,0 +1,258 @@
+# cdcl.py
+# Conflict-driven search: the engine of engine.py, learning a nogood from
+# every dead end and backjumping past the decisions that had nothing to do
+# with it.
+#
+# Each decision (fixing a square to a digit) opens a new level.  Every
+# square keeps the set of levels its candidates depend on, as a bit mask:
+# a decision depends only on its own level, and a run revision makes the
+# squares it changes depend on the levels of every square in the run.  When
+# a run can't be filled, the levels of its squares are the conflict: the
+# decisions at those levels can't all stand.  That nogood is learned, the
+# search jumps back to the highest of the other levels in it, and the
+# digit of the latest decision is eliminated there.
+#
+# Learned nogoods are propagated like runs: when all but one of the
+# decisions in a nogood hold, the last is eliminated.  At most maxNogoods
+# are kept; when there are more, the less active half (those that have
+# pruned or failed least) are evicted.  Nogoods ruling out solutions
+# already found are never evicted, so no solution is found twice.
+# Nogoods hold only for the search that learned them, from the candidates
+# it started with and ruling out the solutions it found, so each search
+# starts with none.
+#
+# There is no bound on the nogoods ruling out solutions: one is kept per
+# solution, and every one is checked as squares are fixed.  Enumerating a
+# puzzle's solutions therefore slows down as they are found, and with
+# hundreds of solutions cdcl is many times slower than the engine.  It is
+# meant for uniqueness checks, which stop at the second solution.
+
+from timeit import default_timer as clock
+from candidates import POPCOUNT, DIGITS
+from engine import Engine, DEADLINE, CANCEL
+
+MAX_NOGOODS = 2000          # learned nogoods kept
+
+class CDCLEngine(Engine):
+  def __init__(self, model, order = 'mrv', values = 'ascending',
+               maxNogoods = MAX_NOGOODS):
+    # As for Engine.  order chooses the square to decide; the first digit
+    # of values is tried, and the others only as conflicts eliminate it.
+
+    Engine.__init__(self, model, order, values)
+    self.maxNogoods = maxNogoods
+    self.forget()
+    self.learned = 0            # nogoods learned
+    self.evicted = 0            # nogoods evicted
+    self.backjumps = 0          # conflicts undoing more than one level
+
+  def statistics(self):
+    # Engine.statistics, with the nogoods learned and evicted, the number
+    # kept now, and the backjumps
+
+    stats = Engine.statistics(self)
+    stats['learned'] = self.learned
+    stats['evicted'] = self.evicted
+    stats['nogoods'] = len(self.nogoods)
+    stats['backjumps'] = self.backjumps
+    return stats
+
+  def forget(self):
+    # Drop every nogood
+
+    self.nogoods = {}           # id -> [literals, activity, permanent]
+    self.watches = [[] for c in self.variables]
+    self.nextId = 0
+    self.kept = 0               # learned nogoods kept, as maxNogoods counts
+
+  def learn(self, literals, permanent = False):
+    # Add a nogood, a list of (cell, digit) pairs that can't all hold
+
+    self.nogoods[self.nextId] = [literals, 0, permanent]
+    for c, d in literals:
+      self.watches[c].append(self.nextId)
+    self.nextId += 1
+    if not permanent:
+      self.learned += 1
+      self.kept += 1
+      if self.kept > self.maxNogoods:
+        self.evict()
+
+  def evict(self):
+    # Drop the less active half of the learned nogoods, and age the rest
+
+    learned = sorted((entry[1], key) for key, entry in self.nogoods.items()
+                     if not entry[2])
+    for activity, key in learned[:len(learned)//2]:
+      del self.nogoods[key]
+      self.evicted += 1
+      self.kept -= 1
+    for entry in self.nogoods.values():
+      entry[1] //= 2
+    self.watches = [[key for key in keys if key in self.nogoods]
+                    for keys in self.watches]
+
+  def checkNogood(self, entry, candidates, reasons):
+    # Returns None if the nogood can't prune yet, (cell, bit, levels) if
+    # it eliminates bit from cell, or (None, None, levels) if it is broken
+
+    levels, unknown = 0, None
+    for c, d in entry[0]:
+      m, b = candidates[c], 1 << (d-1)
+      if m == b:
+        levels |= reasons[c]
+      elif m & b and unknown is None:
+        unknown = c, b
+      else:
+        return None
+    entry[1] += 1
+    if unknown is None:
+      return None, None, levels
+    return unknown[0], unknown[1], levels
+
+  def propagateLevels(self, candidates, reasons, queue, fixed = ()):
+    # Engine.propagate, tracking levels: revise runs and nogoods until
+    # nothing changes, starting with the run indices in queue and the
+    # nogoods on the squares in fixed.  reasons are the levels each square
+    # depends on, updated with the candidates.
+    # Returns None, or the levels of the conflict on a contradiction.
+
+    start = clock()
+    pending = list(queue)
+    queued = set(pending)
+    fixed = list(fixed)
+    conflict = None
+    while conflict is None and (pending or fixed):
+      if fixed:
+        changed = []
+        for key in self.watches[fixed.pop()]:
+          entry = self.nogoods.get(key)
+          found = entry and self.checkNogood(entry, candidates, reasons)
+          if not found:
+            continue
+          c, b, levels = found
+          if c is None:
+            conflict = levels
+            break
+          candidates[c] &= ~b
+          reasons[c] |= levels
+          changed.append(c)
+      else:
+        idx = pending.pop()
+        queued.discard(idx)
+        levels = 0
+        for c in self.runs[idx][0]:
+          levels |= reasons[c]
+        changed = self.reviseRun(idx, candidates)
+        if changed is None:
+          conflict = levels
+          break
+        for c in changed:
+          reasons[c] |= levels
+      for c in changed:
+        if POPCOUNT[candidates[c]] == 1:
+          fixed.append(c)
+        for other in self.runsOf[c]:
+          if other not in queued:
+            queued.add(other)
+            pending.append(other)
+    self.propagateTime += clock() - start
+    return conflict
+
+  def broken(self, candidates, reasons):
+    # The levels of a permanent nogood broken by a complete assignment, or
+    # None.  Nogoods are only checked as squares are fixed, so one learned
+    # after its squares were fixed can be missed until now.
+
+    for entry in self.nogoods.values():
+      if entry[2]:
+        found = self.checkNogood(entry, candidates, reasons)
+        if found and found[0] is None:
+          return found[2]
+    return None
+
+  def search(self, candidates, limit = None, deadline = None, cancel = None):
+    # As for Engine.search
+
+    solutions = []
+    self.stoppedBy = None
+    self.forget()
+    start, propagating = clock(), self.propagateTime
+    candidates = candidates[:]
+    reasons = [0] * len(candidates)
+
+    # trail holds a (cell, digit, candidates, reasons) entry for each level,
+    # the last two being the state just before the decision was made
+
+    trail = []
+    conflict = None
+    blocked = False             # the conflict is a solution just ruled out
+    while True:
+      if cancel is not None and cancel.cancelled:
+        self.stoppedBy = CANCEL
+        break
+      if deadline is not None and clock() > deadline:
+        self.stoppedBy = DEADLINE
+        break
+      if conflict is None:
+        best = self.chooseCell(candidates)
+        if best is None:
+          conflict = self.broken(candidates, reasons)
+          if conflict is not None:
+            continue
+          solutions.append({v: DIGITS[m][0]
+                            for v, m in zip(self.variables, candidates)})
+          if limit is not None and len(solutions) >= limit:
+            break
+
+          # Rule the solution out, and carry on as if it were a conflict
+
+          conflict = 0
+          for levels in reasons:
+            conflict |= levels
+          if conflict:
+            self.learn([trail[k-1][:2] for k in range(1, len(trail)+1)
+                        if conflict >> k & 1], True)
+          blocked = True
+          continue
+        self.nodes += 1
+        d = self.orderValues(best, candidates)[0]
+        trail.append((best, d, candidates[:], reasons[:]))
+        level = len(trail)
+        if level > self.maxDepth:
+          self.maxDepth = level
+        candidates[best] = 1 << (d-1)
+        reasons[best] = 1 << level
+        conflict = self.propagateLevels(candidates, reasons, self.runsOf[best],
+                                  [best])
+        continue
+
+      # Learn from the conflict, jump back to the highest other level in
+      # it, and eliminate the digit of its latest decision there
+
+      self.backtracks += 1
+      if not conflict:
+        break                   # the puzzle has no more solutions
+      latest = conflict.bit_length() - 1
+      rest = conflict & ~(1 << latest)
+      back = rest.bit_length() - 1 if rest else 0
+
+      # A nogood of one decision needn't be kept: its digit is eliminated
+      # at level 0, which is never undone
+
+      if rest and not blocked:
+        self.learn([trail[k-1][:2] for k in range(1, latest+1)
+                    if conflict >> k & 1])
+      blocked = False
+      if len(trail) - back > 1:
+        self.backjumps += 1
+      cell, d = trail[latest-1][:2]
+      candidates, reasons = trail[back][2], trail[back][3]
+      del trail[back:]
+      candidates[cell] &= ~(1 << (d-1))
+      reasons[cell] |= rest
+      conflict = self.propagateLevels(candidates, reasons, self.runsOf[cell],
+                                [cell] if POPCOUNT[candidates[cell]] == 1
+                                else ())
+    self.searchTime += clock() - start - (self.propagateTime - propagating)
+    return solutions
@@ -0,0 +1,39 @@
+# combos.py
+# Index of the ways to fill a run, built once at import.
+# COMBOS[clue, n] describes the sets of n distinct digits summing to clue:
+#   masks  the combinations themselves, as candidate masks (see candidates.py)
+#   union  the digits appearing in at least one combination
+#   must   the digits appearing in every combination
+# A (clue, n) pair with no combinations is absent; use lookup() to get an
+# empty entry for it instead of a KeyError.
+
+from collections import namedtuple
+from itertools import combinations
+
+Combos = namedtuple('Combos', 'masks union must')
+NONE = Combos((), 0, 0)
+
+def buildIndex():
+  masks = {}
+  digits = list(range(1,10))
+  for n in digits:
+    for c in combinations(digits, n):
+      masks.setdefault((sum(c), n), []).append(sum(1 << (d-1) for d in c))
+  index = {}
+  for key, ms in masks.items():
+    union, must = 0, 0x1ff
+    for m in ms:
+      union |= m
+      must &= m
+    index[key] = Combos(tuple(ms), union, must)
+  return index
+
+COMBOS = buildIndex()
+
+def lookup(clue, n):
+  return COMBOS.get((clue, n), NONE)
+
+def isPossible(clue, n):
+  # Can n distinct digits sum to clue?
+
+  return (clue, n) in COMBOS
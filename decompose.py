@@ -0,0 +1,321 @@
+# decompose.py
+# Split a puzzle into independent regions before searching.
+# Two white squares are linked when they share a run.  The connected
+# components of this graph can be solved separately: the solutions of the
+# whole puzzle are the combinations of the solutions of its components.
+# Within a component, an articulation cell (one whose removal disconnects
+# the component) splits it further.  Once the cell's digit is fixed, the
+# sides it joins are independent, so the component's solutions are, for
+# each digit the cell can take, the combinations of the solutions of the
+# sides.
+# Decomposer has the same interface as engine.Engine, so kakuroCSP can run
+# either.
+# A RegionCache passed to Decomposer keeps the solutions of each region it
+# solves, keyed by the region's squares, runs and clues and the digits fixed
+# in it, so solving a puzzle again after an edit only searches the regions
+# the edit touched.
+
+import multiprocessing
+from collections import OrderedDict
+from itertools import islice, product
+from candidates import POPCOUNT, DIGITS
+from engine import Engine, emptyStats, mergeStats
+from runs import RunModel, Run
+
+MIN_SIDE = 30       # smallest side worth splitting off at an articulation cell
+MAX_SPLITS = 8      # nesting limit for articulation splits
+
+def neighbours(model):
+  # For each cell number, the set of cells sharing a run with it
+
+  adj = [set() for v in model.cells]
+  for run in model.runs:
+    for c in run.cells:
+      adj[c].update(run.cells)
+  for c, ns in enumerate(adj):
+    ns.discard(c)
+  return adj
+
+def components(adj, cells):
+  # Connected components of the graph adj restricted to cells, as sorted
+  # lists of cell numbers
+
+  left = set(cells)
+  parts = []
+  while left:
+    start = left.pop()
+    part, stack = [start], [start]
+    while stack:
+      for n in adj[stack.pop()]:
+        if n in left:
+          left.remove(n)
+          part.append(n)
+          stack.append(n)
+    parts.append(sorted(part))
+  return parts
+
+def articulationCells(adj, cells):
+  # Articulation points of the graph adj restricted to cells, by Tarjan's
+  # algorithm, with an explicit stack rather than recursion
+
+  inside = set(cells)
+  disc, low = {}, {}
+  found = set()
+  counter = 0
+  for root in cells:
+    if root in disc:
+      continue
+    disc[root] = low[root] = counter
+    counter += 1
+    children = 0
+    stack = [(root, None, iter(adj[root]))]
+    while stack:
+      node, parent, pending = stack[-1]
+      for n in pending:
+        if n not in inside:
+          continue
+        if n not in disc:
+          disc[n] = low[n] = counter
+          counter += 1
+          stack.append((n, node, iter(adj[n])))
+          break
+        if n != parent:
+          low[node] = min(low[node], disc[n])
+      else:
+        stack.pop()
+        if parent is None:
+          continue
+        low[parent] = min(low[parent], low[node])
+        if parent == root:
+          children += 1
+        elif low[node] >= disc[parent]:
+          found.add(parent)
+    if children > 1:
+      found.add(root)
+  return found
+
+def subModel(model, cells):
+  # The RunModel of the region made up of the given cell numbers, with the
+  # runs lying wholly inside it.  Cells are renumbered in the order given.
+
+  index = {c: k for k, c in enumerate(cells)}
+  ids = set()
+  for c in cells:
+    ids.update(model.runsOf(c))
+  runs = []
+  for idx in sorted(ids):
+    run = model.runs[idx]
+    if all(c in index for c in run.cells):
+      runs.append(Run(run.black, run.direction, run.clue,
+                      tuple(index[c] for c in run.cells)))
+  return RunModel([model.cells[c] for c in cells], runs)
+
+def combine(groups, limit):
+  # Merge one solution from each group in every possible way, stopping
+  # after limit merged solutions if limit is given
+
+  merged = []
+  for choice in islice(product(*groups), limit):
+    soln = {}
+    for part in choice:
+      soln.update(part)
+    merged.append(soln)
+  return merged
+
+def regionKey(model, assume, limit):
+  # The cache key of a region: its RunModel, with its cells as coords, the
+  # digits assumed in it, and the solution limit
+
+  runs = tuple((run.black, run.direction, run.clue,
+                tuple(model.cells[c] for c in run.cells)) for run in model.runs)
+  fixed = tuple(sorted((model.cells[c], d) for c, d in assume.items()))
+  return tuple(model.cells), runs, fixed, limit
+
+class RegionCache(object):
+  # Solutions of regions, by regionKey, keeping the size most recently used
+
+  def __init__(self, size = 4096):
+    self.size = size
+    self.entries = OrderedDict()
+    self.hits = self.misses = 0
+
+  def get(self, key):
+    solutions = self.entries.pop(key, None)
+    if solutions is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.entries[key] = solutions
+    return list(solutions)
+
+  def put(self, key, solutions):
+    self.entries.pop(key, None)
+    self.entries[key] = list(solutions)
+    while len(self.entries) > self.size:
+      self.entries.popitem(last = False)
+
+def solvePart(job):
+  # Worker function for parallel solving: job is (model, limit, deadline,
+  # order, values)
+
+  model, limit, deadline, order, values = job
+  solver = Decomposer(model, 1, order, values)
+  solutions = solver.solve(limit, deadline)
+  return solutions, solver.statistics(), solver.stoppedBy
+
+class Decomposer(object):
+  def __init__(self, model, jobs = 1, order = 'mrv', values = 'ascending',
+               cache = None, minSide = MIN_SIDE):
+    # model is a RunModel.  If jobs is more than 1, the components of the
+    # puzzle are solved by that many worker processes.  order and values
+    # are the search strategies passed on to each Engine.  cache is a
+    # RegionCache, or None, and minSide the smallest side worth splitting
+    # off at an articulation cell.
+
+    self.model = model
+    self.jobs = jobs
+    self.order, self.values = order, values
+    self.cache = cache
+    self.minSide = minSide
+    self.adj = neighbours(model)
+    self.engines = []           # every engine run so far
+    self.counted = []           # statistics of the work done by workers
+    self.stoppedBy = None
+
+  @property
+  def nodes(self):
+    return (sum(stats['nodes'] for stats in self.counted) +
+            sum(e.nodes for e in self.engines))
+
+  @property
+  def propagations(self):
+    return (sum(stats['propagations'] for stats in self.counted) +
+            sum(e.propagations for e in self.engines))
+
+  def statistics(self):
+    # As for Engine.statistics, totalled over every region.  maxDepth is
+    # the deepest search within a region.
+
+    total = emptyStats()
+    for stats in self.counted:
+      mergeStats(total, stats)
+    for engine in self.engines:
+      mergeStats(total, engine.statistics())
+    return total
+
+  def solve(self, limit = None, deadline = None, cancel = None):
+    # As for Engine.solve.  If the search is cut short, no partial
+    # solutions are returned, since a solution needs every region.
+
+    self.stoppedBy = None
+    self.deadline, self.cancel = deadline, cancel
+    if any(not run.cells for run in self.model.runs):
+      return []                 # a clue with no run can't be satisfied
+    parts = sorted(components(self.adj, range(len(self.model.cells))),
+                   key = len)
+    if self.jobs > 1 and len(parts) > 1:
+      return self.solveParallel(parts, limit)
+    return self.solveParts(parts, limit, {}, 0)
+
+  def solveParts(self, parts, limit, assume, depth):
+    # Solutions of the union of independent regions.  assume maps cell
+    # numbers to digits already fixed by an enclosing split.
+
+    groups = []
+    for part in sorted(parts, key = len):
+      solutions = self.solveRegion(part, limit, assume, depth)
+      if not solutions or self.stoppedBy:
+        return []
+      groups.append(solutions)
+    return combine(groups, limit)
+
+  def solveRegion(self, cells, limit, assume, depth):
+    # Propagate the clues of the region first: if that settles it, or it
+    # is too small to be worth splitting, there's no need to split
+
+    model = subModel(self.model, cells)
+    local = self.localAssume(model, cells, assume)
+    if self.cache is not None:
+      key = regionKey(model, local, limit)
+      solutions = self.cache.get(key)
+      if solutions is None:
+        solutions = self.searchRegion(model, cells, limit, assume, local,
+                                      depth)
+        if not self.stoppedBy:
+          self.cache.put(key, solutions)
+      return solutions
+    return self.searchRegion(model, cells, limit, assume, local, depth)
+
+  def searchRegion(self, model, cells, limit, assume, local, depth):
+    engine = Engine(model, self.order, self.values)
+    self.engines.append(engine)
+    candidates = engine.reduced(local)
+    if candidates is None:
+      return []
+    if all(POPCOUNT[m] == 1 for m in candidates):
+      return [{v: DIGITS[m][0] for v, m in zip(model.cells, candidates)}]
+    split = None
+    if depth < MAX_SPLITS and len(cells) > 2 * self.minSide:
+      split = self.bestSplit(cells, assume)
+    if split is None:
+      solutions = engine.search(candidates, limit, self.deadline, self.cancel)
+      if engine.stoppedBy:
+        self.stoppedBy = engine.stoppedBy
+      return solutions
+
+    # Branch on the digit of the articulation cell
+
+    pivot, sides = split
+    solutions = []
+    for d in DIGITS[candidates[cells.index(pivot)]]:
+      fixed = dict(assume)
+      fixed[pivot] = d
+      remaining = None if limit is None else limit - len(solutions)
+      solutions.extend(self.solveParts([side + [pivot] for side in sides],
+                                       remaining, fixed, depth+1))
+      if self.stoppedBy:
+        return []
+      if limit is not None and len(solutions) >= limit:
+        break
+    return solutions
+
+  def bestSplit(self, cells, assume):
+    # The articulation cell whose smallest side is largest, and its sides,
+    # or None if no side would have minSide cells
+
+    best, bestSize = None, self.minSide - 1
+    for pivot in articulationCells(self.adj, cells):
+      if pivot in assume:
+        continue
+      sides = components(self.adj, [c for c in cells if c != pivot])
+      size = min(len(side) for side in sides)
+      if size > bestSize:
+        best, bestSize = (pivot, sides), size
+    return best
+
+  def localAssume(self, model, cells, assume):
+    # Translate the fixed cells lying in a region to its cell numbers
+
+    inside = set(cells)
+    return {model.index[self.model.cells[c]]: d
+            for c, d in assume.items() if c in inside}
+
+  def solveParallel(self, parts, limit):
+    pool = multiprocessing.Pool(min(self.jobs, len(parts)))
+    try:
+      jobs = [(subModel(self.model, part), limit, self.deadline,
+               self.order, self.values) for part in parts]
+      results = pool.map(solvePart, jobs)
+      pool.close()
+    finally:
+      pool.terminate()
+      pool.join()
+    groups = []
+    for solutions, stats, stoppedBy in results:
+      self.counted.append(stats)
+      if stoppedBy:
+        self.stoppedBy = stoppedBy
+      groups.append(solutions)
+    if self.stoppedBy or not all(groups):
+      return []
+    return combine(groups, limit)
@@ -0,0 +1,125 @@
+# dedup.py
+# Find duplicate and nearly duplicate puzzles in a library, however each
+# was turned or reflected when it was saved (see canonical.py).
+# Usage:
+#   python dedup.py [--near k] [-o report.tsv] path ...
+# Paths are as for batch.py.  The puzzles are read once, in order, and the
+# report has a tab-separated line for each puzzle that duplicates or nearly
+# duplicates one before it:
+#   file  duplicate  earlier file
+#   file  near      earlier file  clues that differ
+# Two puzzles are near duplicates if they have the same layout of black and
+# white squares, up to symmetry, and differ in at most k clues (2 by
+# default).
+
+import argparse
+import sys
+from kro import KroError
+from archive import ArchiveError
+from canonical import fingerprint, layoutKey, transform
+from batch import puzzleSources, loadPuzzle
+
+NEAR = 2                # most clues that differ between near duplicates
+
+def clueDistance(clues, others):
+  # The number of clues that differ between two puzzles with the same
+  # layout in the same orientation
+
+  return sum((a != b) + (d != e)
+             for ((a, d), (b, e)) in ((clues[k], others[k]) for k in clues))
+
+class DuplicateIndex(object):
+  # Puzzles seen so far, by fingerprint and by layout key
+
+  def __init__(self, near = NEAR):
+    self.near = near
+    self.exact = {}             # fingerprint -> label
+    self.layouts = {}           # layout key -> [(label, clues)]
+
+  def add(self, label, puzzle):
+    # Add a kro.KroPuzzle.  Returns (original, nearby): the label of an
+    # earlier puzzle it duplicates or None, and a list of (label, distance)
+    # for earlier puzzles it nearly duplicates.  A duplicate isn't added.
+
+    key, symmetry = fingerprint(puzzle)
+    if key in self.exact:
+      return self.exact[key], []
+    self.exact[key] = label
+
+    # A symmetric layout has more than one canonical orientation, so the
+    # clues are compared in each
+
+    key, symmetries = layoutKey(puzzle)
+    forms = [transform(puzzle, symmetry).clues for symmetry in symmetries]
+    bucket = self.layouts.setdefault(key, [])
+    nearby = []
+    if self.near:
+      for other, clues in bucket:
+        distance = min(clueDistance(form, clues) for form in forms)
+        if distance <= self.near:
+          nearby.append((other, distance))
+    bucket.append((label, forms[0]))
+    return None, nearby
+
+  def __len__(self):
+    return len(self.exact)
+
+def findDuplicates(sources, near = NEAR):
+  # Generate (label, original, nearby) for each puzzle source (as returned
+  # by batch.puzzleSources) that duplicates or nearly duplicates an earlier
+  # one, as for DuplicateIndex.add.  Puzzles that can't be read are skipped.
+
+  index = DuplicateIndex(near)
+  for source in sources:
+    try:
+      label, puzzle = loadPuzzle(source)
+    except (IOError, OSError, KroError, ArchiveError):
+      continue
+    original, nearby = index.add(label, puzzle)
+    if original is not None or nearby:
+      yield label, original, nearby
+
+def uniqueSources(sources):
+  # Returns (unique, duplicates): the puzzle sources that don't duplicate
+  # an earlier one, and a list of (label, original) for those that do.
+  # Sources that can't be read are kept, so their errors are reported.
+
+  index = DuplicateIndex(0)
+  unique, duplicates = [], []
+  for source in sources:
+    try:
+      label, puzzle = loadPuzzle(source)
+    except (IOError, OSError, KroError, ArchiveError):
+      unique.append(source)
+      continue
+    original, nearby = index.add(label, puzzle)
+    if original is None:
+      unique.append(source)
+    else:
+      duplicates.append((label, original))
+  return unique, duplicates
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = 'Find duplicate puzzles')
+  parser.add_argument('paths', nargs = '+',
+                      help = '.kro files, archives, directories or globs')
+  parser.add_argument('--near', type = int, default = NEAR,
+                      help = 'most clues differing in near duplicates '
+                             '(0 for exact duplicates only)')
+  parser.add_argument('-o', '--output', help = 'write the report to this file')
+  args = parser.parse_args(argv)
+
+  fout = open(args.output, 'w') if args.output else sys.stdout
+  try:
+    for label, original, nearby in findDuplicates(puzzleSources(args.paths),
+                                                  args.near):
+      if original is not None:
+        fout.write('%s\tduplicate\t%s\n' % (label, original))
+      for other, distance in nearby:
+        fout.write('%s\tnear\t%s\t%d\n' % (label, other, distance))
+  finally:
+    if fout is not sys.stdout:
+      fout.close()
+
+if __name__ == '__main__':
+  main()
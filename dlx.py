@@ -0,0 +1,194 @@
+# dlx.py
+# Solve kakuro as an exact cover problem with Knuth's Dancing Links.
+# Primary columns:
+#   one for each white square, which must get exactly one digit
+#   one for each (run, digit) slot, which must be taken exactly once: by
+#     the square of the run holding that digit, or, if the run doesn't use
+#     the digit, by the combination the run takes
+# Rows:
+#   (square, digit)   covers the square, and the digit's slot in each run
+#                     through the square
+#   (run, combination) covers the slots of the digits the combination
+#                     leaves out
+# A run of n squares fills n of its slots with its squares, and only a
+# combination of n digits leaves out the other 9-n, so exactly one
+# combination is chosen for each run, and the squares hold its digits.
+# Rows are only made for the candidates left after propagating the clues
+# (see engine.py), and for the combinations still possible.
+# DLXEngine has the same interface as engine.Engine, so kakuroCSP can run
+# either.
+
+from timeit import default_timer as clock
+from candidates import DIGITS
+from engine import Engine, DEADLINE, CANCEL, emptyStats
+
+class DLXEngine(object):
+  def __init__(self, model):
+    # model is a RunModel (see runs.py)
+
+    self.model = model
+    self.nodes = 0              # rows tried
+    self.propagations = 0       # run revisions before the search
+    self.stoppedBy = None
+    self.searchTime = 0.0
+
+  def statistics(self):
+    # As for Engine.statistics, as far as they apply
+
+    stats = emptyStats()
+    stats['nodes'] = self.nodes
+    stats['propagations'] = self.propagations
+    stats['searchTime'] = self.searchTime
+    return stats
+
+  def build(self, candidates):
+    # Make the linked lists for the given candidates.  Node 0 is the root,
+    # nodes 1 to ncols the column headers.
+
+    model = self.model
+    engine = self.engine
+    ncols = len(model.cells) + 9 * len(model.runs)
+    L = list(range(-1, ncols)); L[0] = ncols
+    R = list(range(1, ncols+2)); R[ncols] = 0
+    U = list(range(ncols+1))
+    D = list(range(ncols+1))
+    C = list(range(ncols+1))
+    S = [0] * (ncols+1)
+    rowOf = [None] * (ncols+1)
+
+    def slot(idx, d):
+      return len(model.cells) + 9*idx + d
+
+    def addRow(columns, label):
+      first = None
+      for col in columns:
+        node = len(C)
+        C.append(col)
+        U.append(U[col])
+        D.append(col)
+        D[U[col]] = node
+        U[col] = node
+        S[col] += 1
+        rowOf.append(label)
+        if first is None:
+          first = node
+          L.append(node)
+          R.append(node)
+        else:
+          L.append(L[first])
+          R.append(first)
+          R[L[first]] = node
+          L[first] = node
+
+    for cell, mask in enumerate(candidates):
+      for d in DIGITS[mask]:
+        addRow([cell+1] + [slot(idx, d) for idx in engine.runsOf[cell]],
+               (cell, d))
+    for idx in range(len(model.runs)):
+      for combo in engine.liveCombos(idx, candidates):
+        unused = [slot(idx, d) for d in DIGITS[0x1ff & ~combo]]
+        if unused:
+          addRow(unused, None)
+    return L, R, U, D, C, S, rowOf
+
+  def solve(self, limit = None, deadline = None, cancel = None):
+    # As for Engine.solve
+
+    self.stoppedBy = None
+    self.engine = Engine(self.model)
+    candidates = self.engine.reduced()
+    self.propagations = self.engine.propagations
+    if candidates is None:
+      return []
+    start = clock()
+    try:
+      return self.search(candidates, limit, deadline, cancel)
+    finally:
+      self.searchTime += clock() - start
+
+  def search(self, candidates, limit, deadline, cancel):
+    L, R, U, D, C, S, rowOf = self.build(candidates)
+
+    def cover(c):
+      L[R[c]] = L[c]
+      R[L[c]] = R[c]
+      i = D[c]
+      while i != c:
+        j = R[i]
+        while j != i:
+          U[D[j]] = U[j]
+          D[U[j]] = D[j]
+          S[C[j]] -= 1
+          j = R[j]
+        i = D[i]
+
+    def uncover(c):
+      i = U[c]
+      while i != c:
+        j = L[i]
+        while j != i:
+          S[C[j]] += 1
+          U[D[j]] = j
+          D[U[j]] = j
+          j = L[j]
+        i = U[i]
+      L[R[c]] = c
+      R[L[c]] = c
+
+    def select(r):
+      j = R[r]
+      while j != r:
+        cover(C[j])
+        j = R[j]
+
+    def unselect(r):
+      j = L[r]
+      while j != r:
+        uncover(C[j])
+        j = L[j]
+
+    # Algorithm X with an explicit stack of the chosen rows, since a board
+    # has more squares than Python's recursion limit
+
+    solutions = []
+    chosen = []
+    while True:
+      if R[0] == 0:
+        solutions.append({self.model.cells[rowOf[r][0]]: rowOf[r][1]
+                          for r in chosen if rowOf[r] is not None})
+        if limit is not None and len(solutions) >= limit:
+          return solutions
+        r = None                # backtrack
+      else:
+        c, fewest = R[0], S[R[0]]
+        j = R[c]
+        while j != 0 and fewest > 1:
+          if S[j] < fewest:
+            c, fewest = j, S[j]
+          j = R[j]
+        cover(c)
+        r = D[c]
+        if r == c:
+          uncover(c)
+          r = None
+
+      # Move to the next row to try: the first row of the new column, or
+      # after backtracking, the row below the last one chosen
+
+      while r is None or r == C[r]:
+        if r is not None:
+          uncover(r)            # r is a column header: the column is done
+        if not chosen:
+          return solutions
+        last = chosen.pop()
+        unselect(last)
+        r = D[last]
+      if cancel is not None and cancel.cancelled:
+        self.stoppedBy = CANCEL
+        return solutions
+      if deadline is not None and clock() > deadline:
+        self.stoppedBy = DEADLINE
+        return solutions
+      self.nodes += 1
+      chosen.append(r)
+      select(r)
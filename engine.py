@@ -0,0 +1,412 @@
+# engine.py
+# Kakuro-specific search engine, used by kakuroCSP in place of the generic
+# python-constraint solver.
+# Each run is treated as a single constraint: its cells hold distinct digits
+# summing to the clue.  For every run the engine keeps the digit combinations
+# that could still fill it, and prunes the candidates of the run's cells
+# against them.  Search is depth-first.  The white square to branch on and
+# the order its digits are tried in are chosen by pluggable strategies,
+# named in VARIABLE_ORDERS and VALUE_ORDERS.
+# White squares are numbered as in the RunModel (see runs.py), and
+# candidates are bitmasks held in an array (see candidates.py).
+
+from timeit import default_timer as clock
+from candidates import ALL, POPCOUNT, DIGITS, candidateArray
+from combos import lookup
+
+# Reasons a solve can end before the search is complete
+
+DEADLINE = 'deadline'
+CANCEL   = 'cancel'
+
+class CancelToken(object):
+  # Shared between a solve and any code that may want to stop it, possibly
+  # on another thread.  The search checks it before each node.
+
+  def __init__(self):
+    self.cancelled = False
+
+  def cancel(self):
+    self.cancelled = True
+
+# Strategies for choosing the white square to branch on:
+#   mrv     the square with the fewest candidates
+#   run     a square with the fewest candidates in the run with the fewest
+#           remaining combinations, ties going to the run with the fewest
+#           open squares
+#   combos  the square whose runs have the fewest remaining combinations
+#           between them, ties going to the fewest candidates
+# and for ordering the digits tried there:
+#   ascending, descending
+#   support the digits that appear in the most remaining combinations of
+#           the square's runs first
+
+VARIABLE_ORDERS = ('mrv', 'run', 'combos')
+VALUE_ORDERS = ('ascending', 'descending', 'support')
+
+# The propagation rules, under which eliminated candidates are counted:
+#   combos  digits in no surviving combination of the run
+#   placed  digits already placed elsewhere in the run
+#   hidden  the other candidates of a cell that must hold a digit because
+#           no other cell of the run can
+
+RULES = ('combos', 'placed', 'hidden')
+
+# Search statistics, as returned by Engine.statistics:
+#   nodes           search nodes explored
+#   backtracks      branches refuted by propagation
+#   propagations    run revisions
+#   eliminations    candidates removed, by rule
+#   maxDepth        deepest branch of the search
+#   propagateTime   seconds spent propagating, in reduced and in search
+#   searchTime      seconds spent searching, less the time propagating
+#   runs            a dict for each run with its black square and direction,
+#                   and its revisions, eliminations and failures (revisions
+#                   finding the run impossible)
+# All are plain numbers, lists and dicts, so they can be written with
+# json.dump.
+
+def mergeStats(total, stats):
+  # Add the statistics stats into total, another statistics dict.  Runs are
+  # matched by black square and direction, so the statistics of regions of
+  # one puzzle can be combined.
+
+  for key in ('nodes', 'backtracks', 'propagations', 'propagateTime',
+              'searchTime'):
+    total[key] += stats[key]
+  total['maxDepth'] = max(total['maxDepth'], stats['maxDepth'])
+  for rule in RULES:
+    total['eliminations'][rule] += stats['eliminations'][rule]
+  activity = {(tuple(run['black']), run['direction']): run
+              for run in total['runs']}
+  for run in stats['runs']:
+    key = tuple(run['black']), run['direction']
+    if key in activity:
+      for field in ('revisions', 'eliminations', 'failures'):
+        activity[key][field] += run[field]
+    else:
+      total['runs'].append(dict(run))
+  return total
+
+def emptyStats():
+  return {'nodes': 0, 'backtracks': 0, 'propagations': 0,
+          'eliminations': dict.fromkeys(RULES, 0), 'maxDepth': 0,
+          'propagateTime': 0.0, 'searchTime': 0.0, 'runs': []}
+
+class Engine(object):
+  def __init__(self, model, order = 'mrv', values = 'ascending'):
+    # model is the RunModel of the puzzle (see runs.py), as computed by
+    # kakuroCSP.sanityCheck.  order and values name the search strategies.
+
+    if order not in VARIABLE_ORDERS:
+      raise ValueError('unknown variable order %r' % order)
+    if values not in VALUE_ORDERS:
+      raise ValueError('unknown value order %r' % values)
+    self.chooseCell = getattr(self, 'choose' + order.capitalize())
+    self.orderValues = getattr(self, 'values' + values.capitalize())
+    self.variables = model.cells
+    self.runs = [(run.cells, run.clue) for run in model.runs]
+    self.combos = [lookup(clue, len(cells)) for cells, clue in self.runs]
+    self.runsOf = [model.runsOf(c) for c in range(len(model.cells))]
+    self.labels = [(run.black, run.direction) for run in model.runs]
+    self.stoppedBy = None       # DEADLINE or CANCEL if the last solve was cut short
+
+    # Counters, reported by statistics
+
+    self.nodes = 0              # search nodes explored
+    self.backtracks = 0         # branches refuted by propagation
+    self.propagations = 0       # run revisions
+    self.eliminations = dict.fromkeys(RULES, 0)
+    self.maxDepth = 0
+    self.propagateTime = 0.0
+    self.searchTime = 0.0
+    self.runRevisions = [0] * len(self.runs)
+    self.runEliminations = [0] * len(self.runs)
+    self.runFailures = [0] * len(self.runs)
+
+  def statistics(self):
+    # The counters of every solve so far, as described at the top of the
+    # file
+
+    return {'nodes': self.nodes, 'backtracks': self.backtracks,
+            'propagations': self.propagations,
+            'eliminations': dict(self.eliminations),
+            'maxDepth': self.maxDepth,
+            'propagateTime': self.propagateTime,
+            'searchTime': self.searchTime,
+            'runs': [{'black': list(black), 'direction': direction,
+                      'revisions': revisions, 'eliminations': removed,
+                      'failures': failures}
+                     for (black, direction), revisions, removed, failures
+                     in zip(self.labels, self.runRevisions,
+                            self.runEliminations, self.runFailures)]}
+
+  def initial(self):
+    # Candidates for each white square before any propagation
+
+    candidates = candidateArray(len(self.variables))
+    for (cells, clue), combos in zip(self.runs, self.combos):
+      for c in cells:
+        candidates[c] &= combos.union
+    return candidates
+
+  def reviseRun(self, idx, candidates):
+    # Prune the candidates of the cells in run idx.
+    # Returns the list of cells whose candidates changed, or None if the
+    # run can no longer be filled.
+
+    self.propagations += 1
+    self.runRevisions[idx] += 1
+    cells = self.runs[idx][0]
+    cands = [candidates[c] for c in cells]
+
+    # A combination survives if every cell can take one of its digits, and
+    # every one of its digits can go in some cell
+
+    allowed, must = 0, ALL
+    for combo in self.combos[idx].masks:
+      cover = 0
+      for m in cands:
+        hit = m & combo
+        if not hit:
+          break
+        cover |= hit
+      else:
+        if cover == combo:
+          allowed |= combo
+          must &= combo
+    if not allowed:
+      self.runFailures[idx] += 1
+      return None
+
+    new = pruned = [m & allowed for m in cands]
+
+    # Digits already placed cannot appear elsewhere in the run
+
+    placed = 0
+    for m in new:
+      if POPCOUNT[m] == 1:
+        if placed & m:
+          self.runFailures[idx] += 1
+          return None
+        placed |= m
+    if placed:
+      new = [m if POPCOUNT[m] == 1 else m & ~placed for m in new]
+    cleared = new
+
+    # A digit every surviving combination needs, which only one cell can
+    # hold, must go in that cell.  new is copied before the first change,
+    # to keep the previous stage for the statistics.
+
+    for d in DIGITS[must & ~placed]:
+      b = 1 << (d-1)
+      holders = [k for k, m in enumerate(new) if m & b]
+      if not holders:
+        self.runFailures[idx] += 1
+        return None
+      if len(holders) == 1 and new[holders[0]] != b:
+        if new is cleared:
+          new = new[:]
+        new[holders[0]] = b
+
+    changed = []
+    for c, old, m in zip(cells, cands, new):
+      if not m:
+        self.runFailures[idx] += 1
+        return None
+      if m != old:
+        candidates[c] = m
+        changed.append(c)
+    if changed:
+      self.countEliminations(idx, (cands, pruned, cleared, new))
+    return changed
+
+  def countEliminations(self, idx, stages):
+    # stages are the candidates of run idx before revision and after each
+    # of the rules in turn
+
+    count = POPCOUNT.__getitem__
+    before = sum(map(count, stages[0]))
+    removed = 0
+    for rule, previous, stage in zip(RULES, stages, stages[1:]):
+      if stage is not previous:
+        after = sum(map(count, stage))
+        self.eliminations[rule] += before - after
+        removed += before - after
+        before = after
+    self.runEliminations[idx] += removed
+
+  def propagate(self, candidates, queue):
+    # Revise runs until nothing changes.  queue is an iterable of run indices
+    # to start with.  Returns False on a contradiction.
+
+    start = clock()
+    pending = list(queue)
+    queued = set(pending)
+    consistent = True
+    while pending:
+      idx = pending.pop()
+      queued.discard(idx)
+      changed = self.reviseRun(idx, candidates)
+      if changed is None:
+        consistent = False
+        break
+      for c in changed:
+        for other in self.runsOf[c]:
+          if other not in queued:
+            queued.add(other)
+            pending.append(other)
+    self.propagateTime += clock() - start
+    return consistent
+
+  def reduced(self, assume = None):
+    # Candidates after propagating the clues, with the cells in assume (a
+    # dict mapping cell numbers to digits) fixed beforehand.  Returns None
+    # if there is a contradiction.
+
+    candidates = self.initial()
+    for c, d in (assume or {}).items():
+      candidates[c] &= 1 << (d-1)
+    if not self.propagate(candidates, range(len(self.runs))):
+      return None
+    return candidates
+
+  def solve(self, limit = None, deadline = None, cancel = None, assume = None):
+    # Returns a list of solutions, each a dict mapping white square to digit.
+    # Stops after limit solutions if limit is given.
+    # deadline is a time on the timeit.default_timer clock, and cancel a
+    # CancelToken.  If the deadline passes or the token is cancelled, the
+    # search stops, stoppedBy says why, and the solutions found so far are
+    # returned.
+    # assume is as for reduced.
+
+    self.stoppedBy = None
+    candidates = self.reduced(assume)
+    if candidates is None:
+      return []
+    return self.search(candidates, limit, deadline, cancel)
+
+  def search(self, candidates, limit = None, deadline = None, cancel = None):
+    # Search from candidates, which have already been propagated.
+    # Arguments and result are as for solve.
+
+    solutions = []
+    self.stoppedBy = None
+    start, propagating = clock(), self.propagateTime
+
+    # Depth-first search with an explicit stack, since a large board has
+    # more white squares than Python's recursion limit.  Each entry is a
+    # set of candidates and its depth.
+
+    stack = [(candidates, 0)]
+    while stack:
+      if cancel is not None and cancel.cancelled:
+        self.stoppedBy = CANCEL
+        break
+      if deadline is not None and clock() > deadline:
+        self.stoppedBy = DEADLINE
+        break
+      self.nodes += 1
+      candidates, depth = stack.pop()
+      if depth > self.maxDepth:
+        self.maxDepth = depth
+      best = self.chooseCell(candidates)
+      if best is None:
+        solutions.append({v: DIGITS[m][0]
+                          for v, m in zip(self.variables, candidates)})
+        if limit is not None and len(solutions) >= limit:
+          break
+        continue
+
+      # The stack is last in, first out, so push the digits in reverse
+
+      for d in reversed(self.orderValues(best, candidates)):
+        child = candidates[:]
+        child[best] = 1 << (d-1)
+        if self.propagate(child, self.runsOf[best]):
+          stack.append((child, depth+1))
+        else:
+          self.backtracks += 1
+    self.searchTime += clock() - start - (self.propagateTime - propagating)
+    return solutions
+
+  def liveCombos(self, idx, candidates):
+    # The combinations of run idx still compatible with the candidates of
+    # its cells
+
+    cands = [candidates[c] for c in self.runs[idx][0]]
+    live = []
+    for combo in self.combos[idx].masks:
+      cover = 0
+      for m in cands:
+        hit = m & combo
+        if not hit:
+          break
+        cover |= hit
+      else:
+        if cover == combo:
+          live.append(combo)
+    return live
+
+  # Variable orders, named choose<Order> for each order in
+  # VARIABLE_ORDERS.  Each returns the cell number to branch on, or None if
+  # every cell is fixed.
+
+  def chooseMrv(self, candidates):
+    best, fewest = None, 10
+    for c, m in enumerate(candidates):
+      n = POPCOUNT[m]
+      if 1 < n < fewest:
+        best, fewest = c, n
+        if n == 2:
+          break
+    return best
+
+  def chooseRun(self, candidates):
+    bestRun, bestKey = None, None
+    for idx, (cells, clue) in enumerate(self.runs):
+      unfixed = sum(1 for c in cells if POPCOUNT[candidates[c]] > 1)
+      if not unfixed:
+        continue
+      key = (len(self.liveCombos(idx, candidates)), unfixed)
+      if bestKey is None or key < bestKey:
+        bestRun, bestKey = idx, key
+    if bestRun is None:
+      return self.chooseMrv(candidates)      # cells outside every run
+    cells = [c for c in self.runs[bestRun][0] if POPCOUNT[candidates[c]] > 1]
+    return min(cells, key = lambda c: POPCOUNT[candidates[c]])
+
+  def chooseCombos(self, candidates):
+    counts = [len(self.liveCombos(idx, candidates))
+              for idx in range(len(self.runs))]
+    best, bestKey = None, None
+    for c, m in enumerate(candidates):
+      n = POPCOUNT[m]
+      if n < 2:
+        continue
+      key = (sum(counts[idx] for idx in self.runsOf[c]), n)
+      if bestKey is None or key < bestKey:
+        best, bestKey = c, key
+    return best
+
+  # Value orders, named values<Order> for each order in VALUE_ORDERS.  Each
+  # returns the digits of the cell's candidates in the order they should be
+  # tried.
+
+  def valuesAscending(self, cell, candidates):
+    return DIGITS[candidates[cell]]
+
+  def valuesDescending(self, cell, candidates):
+    return DIGITS[candidates[cell]][::-1]
+
+  def valuesSupport(self, cell, candidates):
+    live = []
+    for idx in self.runsOf[cell]:
+      live.extend(self.liveCombos(idx, candidates))
+    digits = DIGITS[candidates[cell]]
+    return sorted(digits, key = lambda d: -sum(1 for combo in live
+                                               if combo >> (d-1) & 1))
+
+def solve(model, limit = None, deadline = None, cancel = None, assume = None,
+          order = 'mrv', values = 'ascending'):
+  return Engine(model, order, values).solve(limit, deadline, cancel, assume)
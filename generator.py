@@ -0,0 +1,407 @@
+# generator.py
+# Generate kakuro puzzles with unique solutions.
+# Usage:
+#   python generator.py [-n count] [--rows r] [--cols c] [--density d]
+#                       [--symmetry none|rotational|mirror|diagonal]
+#                       [--max-run k] [--seed s] [-j jobs] [-o directory]
+# Each puzzle is made in four steps:
+#   1. a layout of black and white squares, with the given symmetry, every
+#      run from 2 to --max-run squares long and the white squares connected
+#   2. a random filling of the white squares, with distinct digits in each
+#      run
+#   3. the clues of that filling
+#   4. making the solution unique.  The clues are propagated, and each
+#      digit its runs allow is tried in a few of the squares they leave
+#      open.  Changes are weighed by propagating the new clues, which is
+#      much cheaper than solving, and the one leaving the fewest candidates
+#      is kept if it leaves fewer than before.  If none does, an open
+#      square is made black instead, with its mirror image, and the layout
+#      repaired; the square is one whose loss leaves the white squares
+#      connected, and enough of them.  This repeats until the clues settle
+#      every square, so the solution is unique, or the puzzle is abandoned
+#      after MAX_CHANGES changes.  Only if no square can be blackened is
+#      the puzzle solved, to see if it is unique as it stands.
+# A puzzle is given MAX_ATTEMPTS attempts, after which GeneratorError is
+# raised, since the parameters are probably impossible.
+# Puzzles are written as .kro files in the format of savePuzzleKro, which
+# transposes a board with more rows than columns, so a puzzle asked for
+# with --rows greater than --cols comes out turned on its side.  The
+# throughput is reported at the end.  With -j, puzzles are generated by a
+# pool of worker processes.
+
+import argparse
+import multiprocessing
+import os.path
+import random
+import sys
+from timeit import default_timer as clock
+from kro import KroPuzzle, writeKro, grid
+from canonical import transform
+from runs import extractRuns
+from decompose import Decomposer
+from engine import Engine
+from candidates import POPCOUNT
+
+SYMMETRIES = ('none', 'rotational', 'mirror', 'diagonal')
+MAX_RUN = 9
+MIN_WHITE = 0.4         # fraction of the board that must stay white
+FILL_TRIES = 20         # fillings tried for a layout before giving up
+TIMEOUT = 5.0           # seconds allowed for a uniqueness check
+MAX_CHANGES = 60        # changes tried to make a puzzle unique
+TRY_SQUARES = 2         # squares tried for a change at each step
+MAX_ATTEMPTS = 200      # attempts at a puzzle before giving up
+
+class GeneratorError(Exception):
+  pass
+
+def mates(square, rows, cols, symmetry):
+  # The squares that must have the same colour as square.  Squares are
+  # numbered from (1, 1) to (rows, cols), as in a .kro file.
+
+  r, c = square
+  found = set([square])
+  if symmetry == 'rotational':
+    found.add((rows+1-r, cols+1-c))
+  elif symmetry == 'mirror':
+    found.add((r, cols+1-c))
+  elif symmetry == 'diagonal':
+    found.add((c, r))
+  return found
+
+def runsOf(whites, rows, cols):
+  # The runs of a layout, as lists of squares, across runs first
+
+  found = []
+  for r in range(1, rows+1):
+    run = []
+    for c in range(1, cols+2):
+      if (r, c) in whites:
+        run.append((r, c))
+      else:
+        if run:
+          found.append(run)
+        run = []
+  for c in range(1, cols+1):
+    run = []
+    for r in range(1, rows+2):
+      if (r, c) in whites:
+        run.append((r, c))
+      else:
+        if run:
+          found.append(run)
+        run = []
+  return found
+
+def connected(whites):
+  if not whites:
+    return False
+  start = next(iter(whites))
+  seen, stack = set([start]), [start]
+  while stack:
+    r, c = stack.pop()
+    for n in ((r-1, c), (r+1, c), (r, c-1), (r, c+1)):
+      if n in whites and n not in seen:
+        seen.add(n)
+        stack.append(n)
+  return len(seen) == len(whites)
+
+def repair(whites, rows, cols, symmetry, maxRun, rng, grow = True,
+           limit = 1000):
+  # Change squares until every run has 2 to maxRun squares.  A run too long
+  # is cut at a random square inside it.  A square alone in a run is joined
+  # to a black neighbour in the direction of the run, made white, or if it
+  # has none on the board or grow is false, blackened.  Changes whites in
+  # place, and returns False if the runs aren't all right after limit
+  # changes.
+
+  for k in range(limit):
+    for run in runsOf(whites, rows, cols):
+      if len(run) == 1:
+        r, c = run[0]
+        across = (r, c-1) not in whites and (r, c+1) not in whites
+        if across:
+          ends = [(r, c-1), (r, c+1)]
+        else:
+          ends = [(r-1, c), (r+1, c)]
+        ends = [(y, x) for y, x in ends if 1 <= y <= rows and 1 <= x <= cols]
+        if ends and grow:
+          whites.update(mates(rng.choice(ends), rows, cols, symmetry))
+        else:
+          whites.difference_update(mates(run[0], rows, cols, symmetry))
+        break
+      if len(run) > maxRun:
+        cut = run[rng.randrange(1, len(run)-1)]
+        whites.difference_update(mates(cut, rows, cols, symmetry))
+        break
+    else:
+      return True
+  return False
+
+def layout(rows, cols, density, symmetry, maxRun, rng):
+  # A set of white squares, or None if the attempt failed
+
+  whites = set((r, c) for r in range(1, rows+1) for c in range(1, cols+1))
+  for r in range(1, rows+1):
+    for c in range(1, cols+1):
+      if (r, c) in whites and rng.random() < density:
+        whites.difference_update(mates((r, c), rows, cols, symmetry))
+  if not repair(whites, rows, cols, symmetry, maxRun, rng):
+    return None
+  if len(whites) < MIN_WHITE * rows * cols or not connected(whites):
+    return None
+  return whites
+
+def fill(whites, rows, cols, rng, budget = 20000):
+  # A random dict mapping each white square to a digit, with distinct
+  # digits in every run, or None if none was found within budget steps.
+  # Each run leans towards low or high digits, as a setter's would, since
+  # clues near the least or greatest sum of their run have few combinations
+  # and make for puzzles that can be reasoned out.
+
+  order = sorted(whites)
+  acrossOf, downOf = {}, {}
+  lean = []
+  for k, run in enumerate(runsOf(whites, rows, cols)):
+    owner = acrossOf if run[0][0] == run[-1][0] else downOf
+    for square in run:
+      owner[square] = k
+    lean.append(rng.choice((-1, 1)))
+  used = {}                       # run -> set of digits placed in it
+  digits = {}
+  choices = []                    # digits left to try at each square
+  k = 0
+  while 0 <= k < len(order):
+    budget -= 1
+    if budget < 0:
+      return None
+    square = order[k]
+    runs = (acrossOf[square], downOf[square])
+    if len(choices) <= k:
+      taken = used.get(runs[0], set()) | used.get(runs[1], set())
+      slope = lean[runs[0]] + lean[runs[1]]
+      options = [d for d in range(1, 10) if d not in taken]
+      options.sort(key = lambda d: slope * d + rng.uniform(0, 9))
+      choices.append(options)
+    elif square in digits:
+      d = digits.pop(square)
+      for run in runs:
+        used[run].discard(d)
+    if choices[k]:
+      d = choices[k].pop()
+      digits[square] = d
+      for run in runs:
+        used.setdefault(run, set()).add(d)
+      k += 1
+    else:
+      choices.pop()
+      k -= 1
+  if k < 0:
+    return None
+  return digits
+
+def neighbourDigits(whites, digits, square):
+  # The digits of the other squares of the runs through square
+
+  found = set()
+  r, c = square
+  for dr, dc in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+    k = (r+dr, c+dc)
+    while k in whites:
+      found.add(digits[k])
+      k = (k[0]+dr, k[1]+dc)
+  return found
+
+def clues(whites, digits, rows, cols):
+  # The clues of a filling, for every black square of the board, row and
+  # column 0 included
+
+  found = {}
+  for r in range(rows+1):
+    for c in range(cols+1):
+      if (r, c) in whites:
+        continue
+      across = down = 0
+      k = c+1
+      while (r, k) in whites:
+        across += digits[r, k]
+        k += 1
+      k = r+1
+      while (k, c) in whites:
+        down += digits[k, c]
+        k += 1
+      found[r, c] = (across, down)
+  return found
+
+def weigh(whites, digits, rows, cols):
+  # Returns (puzzle, model, left, open) for the puzzle with the clues of a
+  # filling: its RunModel, the number of candidates left when its clues
+  # are propagated, and the white squares still open then
+
+  puzzle = KroPuzzle(rows, cols, clues(whites, digits, rows, cols),
+                     {w: digits[w] for w in whites})
+  model = extractRuns(*grid(puzzle))
+  candidates = Engine(model).reduced()
+  return (puzzle, model, sum(POPCOUNT[m] for m in candidates),
+          [w for w, m in zip(model.cells, candidates) if POPCOUNT[m] > 1])
+
+def tally(model, timeout):
+  # The solutions of a puzzle, at most 2 of them, or None if the search
+  # took more than timeout seconds
+
+  solver = Decomposer(model)
+  solutions = solver.solve(2, clock() + timeout)
+  return None if solver.stoppedBy else solutions
+
+def landscape(puzzle):
+  # The puzzle transposed if it has more rows than columns, as
+  # savePuzzleKro saves it to better fit a screen
+
+  if puzzle.rows > puzzle.cols:
+    return transform(puzzle, (True, False, False))
+  return puzzle
+
+def generate(rows, cols, density = 0.25, symmetry = 'rotational',
+             maxRun = MAX_RUN, rng = None, timeout = TIMEOUT):
+  # Returns a KroPuzzle with a unique solution, or None if this attempt
+  # failed.  rows and cols are the dimensions of the board; if rows is
+  # greater than cols, the puzzle is transposed (see landscape).
+
+  if symmetry not in SYMMETRIES:
+    raise GeneratorError('unknown symmetry %r' % symmetry)
+  if symmetry == 'diagonal' and rows != cols:
+    raise GeneratorError('diagonal symmetry needs a square board')
+  rng = rng or random.Random()
+  whites = layout(rows, cols, density, symmetry, maxRun, rng)
+  if whites is None:
+    return None
+  for k in range(FILL_TRIES):
+    digits = fill(whites, rows, cols, rng)
+    if digits is not None:
+      break
+  else:
+    return None
+
+  puzzle, model, left, open = weigh(whites, digits, rows, cols)
+  for changes in range(MAX_CHANGES):
+    if not open:
+      return landscape(puzzle)          # the clues settle every square
+
+    # Try other digits in a few of the squares the clues leave open, and
+    # keep the change leaving the fewest candidates
+
+    rng.shuffle(open)
+    best = None
+    for square in open[:TRY_SQUARES]:
+      old = digits[square]
+      for d in range(1, 10):
+        if d == old or d in neighbourDigits(whites, digits, square):
+          continue
+        digits[square] = d
+        trial = weigh(whites, digits, rows, cols)
+        if best is None or trial[2] < best[2][2]:
+          best = (square, d, trial)
+      digits[square] = old
+    if best is not None and best[2][2] < left:
+      square, d, (puzzle, model, left, open) = best
+      digits[square] = d
+      continue
+
+    # No digit helps, so black out an open square instead, or if none can
+    # be, see whether the puzzle is unique already
+
+    for square in open:
+      smaller = whites - mates(square, rows, cols, symmetry)
+      if (repair(smaller, rows, cols, symmetry, maxRun, rng, False) and
+          len(smaller) >= MIN_WHITE * rows * cols and connected(smaller)):
+        whites = smaller
+        break
+    else:
+      solutions = tally(model, timeout)
+      if solutions is None or len(solutions) != 1:
+        return None
+      return landscape(puzzle)
+    puzzle, model, left, open = weigh(whites, digits, rows, cols)
+  return None
+
+def generateJob(job):
+  # Worker function: job is (seed, rows, cols, density, symmetry, maxRun,
+  # timeout).  Returns (seed, puzzle, attempts), trying up to MAX_ATTEMPTS
+  # times.
+
+  seed, rows, cols, density, symmetry, maxRun, timeout = job
+  rng = random.Random(seed)
+  for attempts in range(1, MAX_ATTEMPTS+1):
+    puzzle = generate(rows, cols, density, symmetry, maxRun, rng, timeout)
+    if puzzle is not None:
+      return seed, puzzle, attempts
+  raise GeneratorError('no %d by %d puzzle with density %g after %d attempts'
+                       % (rows, cols, density, MAX_ATTEMPTS))
+
+def generateMany(count, rows, cols, density = 0.25, symmetry = 'rotational',
+                 maxRun = MAX_RUN, seed = None, jobs = 1, timeout = TIMEOUT):
+  # Generate (seed, puzzle, attempts) for count puzzles, using jobs worker
+  # processes.  Puzzle k is made from seed+k, so a run can be repeated.
+
+  if seed is None:
+    seed = random.randrange(1 << 30)
+  work = [(seed+k, rows, cols, density, symmetry, maxRun, timeout)
+          for k in range(count)]
+  if jobs == 1:
+    for job in work:
+      yield generateJob(job)
+    return
+  pool = multiprocessing.Pool(jobs)
+  try:
+    for result in pool.imap_unordered(generateJob, work):
+      yield result
+    pool.close()
+  finally:
+    pool.terminate()
+    pool.join()
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = 'Generate kakuro puzzles')
+  parser.add_argument('-n', '--count', type = int, default = 10,
+                      help = 'number of puzzles')
+  parser.add_argument('--rows', type = int, default = 10)
+  parser.add_argument('--cols', type = int, default = 10)
+  parser.add_argument('--density', type = float, default = 0.25,
+                      help = 'chance of a square starting black')
+  parser.add_argument('--symmetry', choices = SYMMETRIES,
+                      default = 'rotational')
+  parser.add_argument('--max-run', type = int, default = MAX_RUN,
+                      help = 'longest run allowed')
+  parser.add_argument('--seed', type = int, help = 'seed of the first puzzle')
+  parser.add_argument('--timeout', type = float, default = TIMEOUT,
+                      help = 'seconds allowed for a uniqueness check')
+  parser.add_argument('-j', '--jobs', type = int, default = 1,
+                      help = 'number of worker processes (0 for one per CPU)')
+  parser.add_argument('-o', '--output', default = '.',
+                      help = 'directory for the .kro files')
+  args = parser.parse_args(argv)
+  if not 2 <= args.max_run <= MAX_RUN:
+    parser.error('--max-run must be from 2 to %d' % MAX_RUN)
+  jobs = args.jobs or multiprocessing.cpu_count()
+  if not os.path.isdir(args.output):
+    os.makedirs(args.output)
+
+  start = clock()
+  made = attempts = 0
+  try:
+    for seed, puzzle, tries in generateMany(args.count, args.rows, args.cols,
+                                            args.density, args.symmetry,
+                                            args.max_run, args.seed, jobs,
+                                            args.timeout):
+      name = 'gen%d.kro' % seed
+      with open(os.path.join(args.output, name), 'w') as fout:
+        writeKro(fout, puzzle, name)
+      made += 1
+      attempts += tries
+  except GeneratorError as x:
+    sys.exit(str(x))
+  elapsed = clock() - start
+  print('%d puzzles in %.2f seconds, %.2f puzzles/second, %d attempts' %
+        (made, elapsed, made / elapsed if elapsed else 0.0, attempts))
+
+if __name__ == '__main__':
+  main()
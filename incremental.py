@@ -0,0 +1,54 @@
+# incremental.py
+# Recheck a puzzle after each edit, reusing the work of the last check.
+# A setter tweaking one clue at a time until the puzzle has a unique
+# solution would otherwise solve the whole puzzle from nothing each time.
+# IncrementalSolver takes the edits through a ClueValidator (validator.py),
+# and solves with a Decomposer sharing a RegionCache between checks, so only
+# the regions whose runs or clues changed are searched again.  It splits
+# regions at articulation cells more eagerly than a one-off solve, since
+# the smaller the regions, the more of them an edit leaves untouched.
+
+from decompose import Decomposer, RegionCache
+from kakuroCSP import runEngine
+from runs import extractRuns
+from validator import ClueValidator
+
+MIN_SIDE = 6            # smallest side split off at an articulation cell
+
+class IncrementalSolver(object):
+  def __init__(self, rows, cols, across = None, down = None,
+               cacheSize = 4096):
+    # The arguments are as for ClueValidator.  cacheSize is the number of
+    # region results kept.
+
+    self.validator = ClueValidator(rows, cols, across, down)
+    self.cache = RegionCache(cacheSize)
+    self.engine = None          # the Decomposer of the last check
+
+  # Edits, as for ClueValidator.  Each returns the runs touched.
+
+  def setClue(self, coords, across, down):
+    return self.validator.setClue(coords, across, down)
+
+  def setBlack(self, coords, across = 0, down = 0):
+    return self.validator.setBlack(coords, across, down)
+
+  def setWhite(self, coords):
+    return self.validator.setWhite(coords)
+
+  def contradictions(self):
+    return self.validator.contradictions()
+
+  def check(self, allSolutions = False, deadline = None, cancel = None):
+    # Solve the puzzle as it now stands.  Arguments and result are as for
+    # kakuroCSP.solve; the stats also give the cache hits and misses of
+    # this check.
+
+    model = extractRuns(*self.validator.grid())
+    self.engine = Decomposer(model, cache = self.cache, minSide = MIN_SIDE)
+    hits, misses = self.cache.hits, self.cache.misses
+    result = runEngine(self.engine, None if allSolutions else 2,
+                       deadline, cancel)
+    result.stats['cacheHits'] = self.cache.hits - hits
+    result.stats['cacheMisses'] = self.cache.misses - misses
+    return result
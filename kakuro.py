@@ -12,11 +12,12 @@ from tkMessageBox import *                    # get standard dialogs
 from tkFileDialog import *
 import tkFont
 import thread
-import time, os.path, re
+import time, os.path
 from solver import Solver
 from player import Player
 from utilities import displayDialog, StopWatch
 import kakuroCSP
+from kro import loadKro, KroError
 
 class Kakuro(Frame):
 
@@ -120,14 +121,24 @@ class Kakuro(Frame):
         return
     self.timer.pause(reset = True)
     self.fileOpenDir = os.path.dirname(fname.name)
-    text = fname.read()
-
-    dimPattern = re.compile(r'(\d+) by (\d+)')
-    rows, cols = dimPattern.search(text).groups()
-    self.drawNew(int(rows), int(cols), 'Solver')
-    cluePattern = re.compile(r'\d+ +\d+ +\d+ +\d+.*\n')
-    clues = cluePattern.findall(text)
-    self.solver.displayClues(clues)
+    puzzle = self.readPuzzle(fname)
+    if not puzzle:
+      return
+    self.drawNew(puzzle.rows, puzzle.cols, 'Solver')
+    self.solver.displayClues(puzzle.clues)
+
+  def readPuzzle(self, fin):
+    # Load a .kro file, reporting any error to the user.
+    # Returns the kro.KroPuzzle, or None if the file can't be read.
+
+    try:
+      puzzle = loadKro(fin)
+    except KroError, x:
+      showerror('Bad Puzzle File', str(x))
+      return None
+    finally:
+      fin.close()
+    return puzzle
 
   def savePuzzleKro(self):
     # Save puzzle in .kro format
@@ -181,14 +192,11 @@ class Kakuro(Frame):
     if not fname:
         return
     self.fileOpenDir = os.path.dirname(fname.name)
-    text = fname.read()
-
-    dimPattern = re.compile(r'(\d+) by (\d+)')
-    rows, cols = dimPattern.search(text).groups()
-    self.drawNew(int(rows), int(cols), 'Player')
-    cluePattern = re.compile(r'\d+ +\d+ +\d+ +\d+.*\n')
-    clues = cluePattern.findall(text)
-    self.player.displayClues(clues)
+    puzzle = self.readPuzzle(fname)
+    if not puzzle:
+      return
+    self.drawNew(puzzle.rows, puzzle.cols, 'Player')
+    self.player.displayClues(puzzle.clues)
     self.timer.pause(reset = True)
 
   def savePuzzleKak(self):
@@ -1,98 +1,224 @@
 # kakuroCSP.py
 # Solve a kakuro puzzle as a constraint satisfaction problem
-# Constraint API documentation is available at
-# http://labix.org/doc/constraint/
-# Documentation isn't very good.  There are examples at
-# http://www.csee.umbc.edu/courses/graduate/CMSC671/fall12/code/python/python-constraint-1.1/examples/
-
-from constraint import Problem, ExactSumConstraint, AllDifferentConstraint
-from collections import namedtuple, defaultdict
-from itertools import combinations
+# The search itself is done by the Kakuro-specific engine in engine.py,
+# which treats each run as a single sum-and-distinct constraint.  The
+# puzzle is first split into independent regions (see decompose.py), which
+# are searched separately.  The dlx backend solves the puzzle as an exact
+# cover problem instead (see dlx.py), and the cdcl backend searches the
+# whole puzzle learning from its conflicts (see cdcl.py).
+
+from engine import CancelToken, DEADLINE, CANCEL
+from decompose import Decomposer
+from dlx import DLXEngine
+from cdcl import CDCLEngine
+from runs import extractRuns
+from collections import namedtuple
+from timeit import default_timer as clock
+import threading
 
 Equation = namedtuple('Equations', 'variables clue')
 solverDone = False          # signal completion to main thread
 
-def kakuroCSP():
-
-  # Pre: variables and equations have been computed by sanityCheck
-  # Will be run in a background thread
-
-  global solutions, variables       # will be accessed by main thread
-  global solverDone
-
-  problem = Problem()
+# Outcomes of a uniqueness check
 
-  # Restrict the value of each white square as much as possible
+NO_SOLUTION = 'no solution'
+UNIQUE      = 'unique'
+MULTIPLE    = 'not unique'
+CANCELLED   = 'cancelled'
+TIMED_OUT   = 'timed out'
+ERROR       = 'error'       # the solver raised an exception (see SolveJob)
 
-  domains = defaultdict(set)
-  univ = list(range(1,10))
-  for n in univ:
-    for c in combinations(univ, n):
-      domains[sum(c), n] |= set(c)
+# stats holds the search statistics (see the top of engine.py) and the
+# elapsed time, and is filled in even when a solve is cut short.  It can be
+# written out with json.dump.
 
-  candidates = {v: set(univ) for v in variables}
-  for eq in equations:
-    for v in eq.variables:
-      candidates[v] &= domains[eq.clue, len(eq.variables)]
+SolveResult = namedtuple('SolveResult', 'status solutions stats')
 
-  # one variable for each white square, with values in range computed above
+# Search backends.  The dlx backend ignores jobs and the strategies, and
+# only counts nodes and propagations in its stats.  The cdcl backend
+# ignores jobs, and adds the nogoods learned to its stats; it slows down
+# enumerating many solutions (see cdcl.py).
 
-  for v in variables:
-    problem.addVariable(v, tuple(candidates[v]))
+BACKENDS = ('engine', 'dlx', 'cdcl')
 
-  for eq in equations:
-    # All the numbers in a single sum are distinct
+def kakuroCSP(allSolutions = False):
 
-    problem.addConstraint(AllDifferentConstraint(), eq.variables)
+  # Pre: model, variables and equations have been computed by sanityCheck
+  # Will be run in a background thread
+  # By default, only verifies that the solution is unique: the search stops
+  # at the second solution, so solutions holds at most two witnesses.
+  # If allSolutions is true, every solution is enumerated.
 
-    # The numbers must sum to the clue
+  # New code should use SolveJob, which doesn't need the globals.
 
-    problem.addConstraint(ExactSumConstraint(eq.clue), eq.variables)
+  global solutions, variables, status       # will be accessed by main thread
+  global solverDone, stats
 
-  solutions = problem.getSolutions()
+  status, solutions, stats = solve(model, allSolutions)
   solverDone = True
 
+def solve(model, allSolutions = False, deadline = None, cancel = None,
+          jobs = 1, order = 'mrv', values = 'ascending', backend = 'engine'):
+  # The solve entry point.  model is a RunModel (see runs.py).
+  # Unless allSolutions is true, the search stops at the second solution.
+  # deadline is a time on the timeit.default_timer clock, and cancel an
+  # engine.CancelToken; the search checks both as it goes, and stops with
+  # status TIMED_OUT or CANCELLED.
+  # If jobs is more than 1, independent regions of the puzzle are solved in
+  # that many processes; the cancel token doesn't reach them.
+  # order and values choose the search strategies, from
+  # engine.VARIABLE_ORDERS and engine.VALUE_ORDERS, and backend the search
+  # itself, from BACKENDS.
+  # Returns a SolveResult.
+
+  return runEngine(makeEngine(model, jobs, order, values, backend),
+                   None if allSolutions else 2, deadline, cancel)
+
+def makeEngine(model, jobs, order, values, backend):
+  if backend == 'dlx':
+    return DLXEngine(model)
+  if backend == 'cdcl':
+    return CDCLEngine(model, order, values)
+  if backend != 'engine':
+    raise ValueError('unknown backend %r' % (backend,))
+  return Decomposer(model, jobs, order, values)
+
+def runEngine(engine, limit, deadline, cancel):
+  start = clock()
+  solutions = engine.solve(limit, deadline, cancel)
+  stats = engine.statistics()
+  stats['elapsed'] = clock() - start
+  return SolveResult(outcome(engine.stoppedBy, len(solutions)), solutions,
+                     stats)
+
+def outcome(stoppedBy, count):
+  # The status of a solve stopped by stoppedBy (see engine.py), having
+  # found count solutions
+
+  if stoppedBy == DEADLINE:
+    return TIMED_OUT
+  if stoppedBy == CANCEL:
+    return CANCELLED
+  return (NO_SOLUTION, UNIQUE, MULTIPLE)[min(count, 2)]
+
+def checkUnique(model, deadline = None, cancel = None):
+  # Returns (status, witnesses), where status is NO_SOLUTION, UNIQUE or
+  # MULTIPLE (or TIMED_OUT or CANCELLED), and witnesses is a list of at
+  # most two solutions.
+
+  status, witnesses, stats = solve(model, False, deadline, cancel)
+  return status, witnesses
+
+class SolveJob(object):
+  # A solve with its own engine and results, run on a worker thread by
+  # start().  Several jobs can run at once, and each can be cancelled.
+  # Completion can be awaited with wait() or result(), or signalled by
+  # callbacks registered with addDoneCallback.  Callbacks run on the worker
+  # thread; a Tk program should use utilities.watchJob instead.
+
+  def __init__(self, model, allSolutions = False, timeout = None,
+               order = 'mrv', values = 'ascending', backend = 'engine'):
+    # model is a RunModel (see runs.py).  Unless allSolutions is true, the
+    # job only checks uniqueness, as kakuroCSP does.  If timeout is given,
+    # the job stops with status TIMED_OUT that many seconds after it starts.
+    # order, values and backend are as for solve.
+
+    self.engine = makeEngine(model, 1, order, values, backend)
+    self.limit = None if allSolutions else 2
+    self.timeout = timeout
+    self.token = CancelToken()
+    self.status = None
+    self.solutions = None
+    self.stats = None
+    self.error = None
+    self.finished = threading.Event()
+    self.lock = threading.Lock()
+    self.callbacks = []
+
+  def start(self):
+    worker = threading.Thread(target = self.run)
+    worker.daemon = True
+    worker.start()
+    return self
+
+  def run(self):
+    # Solve on the calling thread.  If the engine raises an exception, the
+    # job finishes with status ERROR and the exception in error; either
+    # way, waiters are woken and the callbacks are run.
+
+    result = None
+    try:
+      deadline = None if self.timeout is None else clock() + self.timeout
+      result = runEngine(self.engine, self.limit, deadline, self.token)
+    except Exception as x:
+      self.error = x
+    finally:
+      with self.lock:
+        if result is None:
+          self.status, self.solutions, self.stats = ERROR, [], None
+        else:
+          self.status, self.solutions, self.stats = result
+        self.finished.set()
+        callbacks, self.callbacks = self.callbacks, []
+      for callback in callbacks:
+        callback(self)
+
+  def cancel(self):
+    # The job finishes with status CANCELLED, and whatever solutions it had
+    # found
+
+    self.token.cancel()
+
+  def done(self):
+    return self.finished.is_set()
+
+  def wait(self, timeout = None):
+    # Returns True if the job finished within timeout seconds
+
+    return self.finished.wait(timeout)
+
+  def result(self, timeout = None):
+    # Returns (status, solutions), or None if the job isn't done in time
+
+    if not self.finished.wait(timeout):
+      return None
+    return self.status, self.solutions
+
+  def addDoneCallback(self, callback):
+    # callback(job) is called when the job finishes, or at once if it
+    # already has
+
+    with self.lock:
+      if not self.finished.is_set():
+        self.callbacks.append(callback)
+        return
+    callback(self)
+
+  def progress(self):
+    # Counters that grow as the search proceeds
+
+    return {'nodes': self.engine.nodes,
+            'propagations': self.engine.propagations}
+
 def sanityCheck(rows, cols, across, down):
   # Returns a list of impossible clues, if any
-  # As a SIDE EFFECT, initializes the global equations object, and the
-  # the global varaibles object which are used later by kakuroCSP
+  # As a SIDE EFFECT, initializes the global model, equations and
+  # variables objects which are used later by kakuroCSP
 
   # across and down are dicts whose keys are the coords of the black squares,
   # and whose values are the clues.  Besides the blacks square in row and
   # column 0, there are a row and column of sentinel black squares, with
   # inidices row and column.  A clue value of zero means there is no clue.
 
-  global equations, variables
-  equations = []
-  contradictions = []
-
-  # One variable for each white square
-
-  variables = [(r, c) for r in range(rows) for c in range(cols) if
-                (r, c) not in across]
-  for (r, c) in across:
-    clue = across[r, c]
-    if clue == 0: continue
-    # find the next black square in the row
-    nextBlack = min([a[1] for a in across if a[0] == r and a[1] > c])
-    vs = [(r, col) for col in range(c+1, nextBlack)]
-    equations.append(Equation(vs, clue))
-    minSum, maxSum = limits(len(vs))
-    if not minSum <= clue <= maxSum:
-      contradictions.append((r, c, clue, len(vs)))
-
-  for (r, c) in down:
-    clue = down[r, c]
-    if clue == 0: continue
-    # find the next black square in the column
-    nextBlack = min([d[0] for d in down if d[1] == c and d[0] > r])
-    vs = [(row, c) for row in range(r+1, nextBlack)]
-    equations.append(Equation(vs, clue))
-    minSum, maxSum = limits(len(vs))
-    if not minSum <= clue <= maxSum:
-      contradictions.append((r, c, clue, len(vs)))
-
-  return contradictions
+  global model, equations, variables
+
+  # Runs are extracted in a single sweep over the grid; the model is reused
+  # by the solver
+
+  model = extractRuns(rows, cols, across, down)
+  variables = model.cells
+  equations = [Equation(model.coords(run), run.clue) for run in model.runs]
+  return model.contradictions
 
 def limits(n):
   # maximim and minimum sums in n numbers
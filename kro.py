@@ -0,0 +1,129 @@
+# kro.py
+# Read and write .kro puzzle files without the GUI.
+# The format is the one written by Kakuro.savePuzzleKro: a dim line, then
+# a row of 'Row Col Acr Dwn' numbers for each black square, then, after a
+# Solution line, a row of 'Row Col Ans' numbers for each white square.
+# Files are read a line at a time: readRecords yields typed records, and
+# loadKro builds a KroPuzzle from them without holding the text in memory.
+
+import time
+from collections import namedtuple
+
+Dim    = namedtuple('Dim', 'rows cols')
+Clue   = namedtuple('Clue', 'row col across down')
+Answer = namedtuple('Answer', 'row col value')
+
+# rows and cols are the dimensions on the dim line.  clues maps the coords
+# of each black square to its (across, down) clues, and solution maps the
+# coords of each white square to its digit.
+
+KroPuzzle = namedtuple('KroPuzzle', 'rows cols clues solution')
+
+class KroError(Exception):
+  pass
+
+def strayClues(puzzle):
+  # The clues with no run to sum, as (row, col, direction, clue) tuples:
+  # nonzero clues of black squares followed by another black square or the
+  # edge of the board.  Nothing can satisfy them, and canonical.transform
+  # has nowhere to move them, so readers refuse puzzles that have them.
+
+  stray = []
+  for (r, c), (a, d) in sorted(puzzle.clues.items()):
+    if a and (c == puzzle.cols or (r, c+1) in puzzle.clues or r == 0):
+      stray.append((r, c, 'across', a))
+    if d and (r == puzzle.rows or (r+1, c) in puzzle.clues or c == 0):
+      stray.append((r, c, 'down', d))
+  return stray
+
+def readRecords(lines, name = '.kro file'):
+  # Generate a Dim, Clue or Answer record for each data line of lines, an
+  # iterable such as an open file.  Comments, blank lines and the column
+  # headings are skipped.  name is used in error messages.
+
+  inSolution = False
+  for number, line in enumerate(lines, 1):
+    fields = line.split('#', 1)[0].split()
+    if not fields:
+      continue
+    if fields[0] == 'dim':
+      try:
+        if len(fields) != 4 or fields[2] != 'by':
+          raise ValueError
+        yield Dim(int(fields[1]), int(fields[3]))
+      except ValueError:
+        raise KroError('%s, line %d: bad dim line' % (name, number))
+      continue
+    if fields[0] == 'Solution':
+      inSolution = True
+      continue
+    if not fields[0].isdigit():
+      continue                    # a heading
+    try:
+      values = [int(f) for f in fields]
+    except ValueError:
+      raise KroError('%s, line %d: expected numbers' % (name, number))
+    if inSolution and len(values) == 3:
+      yield Answer(*values)
+    elif not inSolution and len(values) == 4:
+      yield Clue(*values)
+    else:
+      raise KroError('%s, line %d: wrong number of fields' % (name, number))
+
+def loadKro(fin):
+  # Build a KroPuzzle from an open file
+
+  dim = None
+  clues, solution = {}, {}
+  for record in readRecords(fin, getattr(fin, 'name', '.kro file')):
+    if isinstance(record, Clue):
+      clues[record.row, record.col] = (record.across, record.down)
+    elif isinstance(record, Answer):
+      solution[record.row, record.col] = record.value
+    else:
+      dim = record
+  if dim is None:
+    raise KroError('%s: no dimensions' % getattr(fin, 'name', '.kro file'))
+  puzzle = KroPuzzle(dim.rows, dim.cols, clues, solution)
+  for r, c, direction, clue in strayClues(puzzle):
+    raise KroError('%s: %s clue %d at row %d, column %d has no run' %
+                   (getattr(fin, 'name', '.kro file'), direction, clue, r, c))
+  return puzzle
+
+def readKro(fname):
+  with open(fname) as fin:
+    return loadKro(fin)
+
+def writeKro(fout, puzzle, name):
+  # Write puzzle to the open file fout in the layout of savePuzzleKro.
+  # name goes in the heading comment.
+
+  fout.write('# %s\n' % name)
+  fout.write('# %s\n' % time.strftime("%A, %d %B %Y %H:%M:%S"))
+  fout.write('dim %d by %d\n' % (puzzle.rows, puzzle.cols))
+  fout.write('\nBlack Squares\n')
+  fout.write('Row Col Acr Dwn\n\n')
+  for b in sorted(puzzle.clues):
+    clues = puzzle.clues[b]
+    fout.write('%3s %3s %3s %3s\n' % (b[0], b[1], clues[0], clues[1]))
+  fout.write('\nSolution\n')
+  fout.write('Row Col Ans\n\n')
+  for white in sorted(puzzle.solution):
+    fout.write('%3s %3s %3s\n' % (white[0], white[1], puzzle.solution[white]))
+
+def grid(puzzle):
+  # Returns (rows, cols, across, down), the arguments of
+  # kakuroCSP.sanityCheck, sentinel black squares included.
+  # The board has a clue row and column 0 as well as the dimensions of the
+  # puzzle, so rows and cols are one more than the dim line says.
+
+  rows, cols = puzzle.rows+1, puzzle.cols+1
+  across, down = {}, {}
+  for coords, (a, d) in puzzle.clues.items():
+    across[coords] = a
+    down[coords] = d
+  for r in range(rows+1):
+    across[r, cols] = down[r, cols] = 0
+  for c in range(cols+1):
+    across[rows, c] = down[rows, c] = 0
+  return rows, cols, across, down
@@ -0,0 +1,396 @@
+# logic.py
+# Solve kakuro puzzles the way a person would, by named techniques applied
+# cheapest first, recording which ones were needed.  The record is the
+# basis for hints and for rating the difficulty of a puzzle.
+# Techniques, by tier:
+#   1  unique combination      a run with only one combination of digits
+#                              can only hold those digits
+#      naked single            a digit placed in a cell can't appear
+#                              elsewhere in its runs
+#      hidden single           a digit every combination of a run needs,
+#                              which only one cell of the run can hold
+#      combination elimination a cell can only hold digits of the
+#                              combinations its runs can still take
+#   2  combination intersection a digit common to every combination a run
+#                              can still take, which only one cell can hold
+#   3  naked subset            k cells of a run whose candidates between them
+#                              are k digits; no other cell of the run can
+#                              hold those digits
+#      sum remainder           across the runs of a band of rows (or
+#                              columns): the band's across clues add up to
+#                              its total, so the cells left over by the
+#                              down runs lying inside the band, or the cells
+#                              outside it of the down runs crossing it, have
+#                              a known total; each digit must leave the
+#                              rest of those cells a total they can make
+#      combination matching    a digit in a cell must leave the other cells
+#                              of its run digits of one combination, one
+#                              each, to complete the clue
+#   4  search                  trial and error, when no technique applies
+# After each deduction, the techniques are tried again from the cheapest.
+
+from collections import namedtuple
+from itertools import combinations
+from candidates import POPCOUNT, DIGITS, candidateArray
+from combos import lookup
+from engine import Engine
+from kakuroCSP import NO_SOLUTION, UNIQUE, MULTIPLE
+
+# A single application of a technique to one run, or to several (run is
+# then None).  eliminated maps cell numbers to the mask of candidates
+# removed from them.
+
+Deduction = namedtuple('Deduction', 'technique run eliminated')
+
+# The outcome of solve():
+#   status      NO_SOLUTION, UNIQUE or MULTIPLE
+#   solution    dict mapping white square coords to digits, if UNIQUE
+#   deductions  list of Deduction, in the order made
+#   used        dict mapping each technique applied to the number of
+#               deductions it made
+#   tier        the highest tier needed, 4 if search was
+#   candidates  the candidates when the techniques ran out
+#   nodes       the nodes searched, 0 if search wasn't needed
+
+LogicResult = namedtuple('LogicResult',
+                         'status solution deductions used tier candidates '
+                         'nodes')
+
+SUBSET_LIMIT = 4        # largest naked subset looked for
+REMAINDER_LIMIT = 6     # most cells in a sum remainder
+
+# The techniques in the order they are tried: name, tier and the method
+# of LogicSolver that looks for them
+
+TECHNIQUES = (('unique combination', 1, 'uniqueCombination'),
+              ('naked single', 1, 'nakedSingle'),
+              ('hidden single', 1, 'hiddenSingle'),
+              ('combination elimination', 1, 'combinationElimination'),
+              ('combination intersection', 2, 'combinationIntersection'),
+              ('naked subset', 3, 'nakedSubset'),
+              ('sum remainder', 3, 'sumRemainder'),
+              ('combination matching', 3, 'combinationMatching'))
+
+def matches(masks, digits):
+  # Can the cells with the given candidate masks hold the digits of the
+  # mask digits, one each?  Bipartite matching by augmenting paths.
+
+  owner = {}
+  def place(k, seen):
+    for d in DIGITS[masks[k] & digits]:
+      if d in seen:
+        continue
+      seen.add(d)
+      if d not in owner or place(owner[d], seen):
+        owner[d] = k
+        return True
+    return False
+
+  if len(masks) != POPCOUNT[digits]:
+    return False
+  return all(place(k, set()) for k in range(len(masks)))
+
+class LogicSolver(object):
+  def __init__(self, model):
+    # model is a RunModel (see runs.py)
+
+    self.model = model
+    self.runs = [run.cells for run in model.runs]
+    self.combos = [lookup(run.clue, len(run.cells)) for run in model.runs]
+    self.runsOf = [model.runsOf(c) for c in range(len(model.cells))]
+    self.techniques = [(name, tier, getattr(self, method))
+                       for name, tier, method in TECHNIQUES]
+    self.tiers = {name: tier for name, tier, method in TECHNIQUES}
+    self.remainders = self.findRemainders()
+
+  def initial(self):
+    return candidateArray(len(self.model.cells))
+
+  def findRemainders(self):
+    # The sum remainders of the board, as a list of (cells, total), cells
+    # being a tuple of at most REMAINDER_LIMIT cell numbers whose digits
+    # add up to total.  Bands of rows are read with their across runs and
+    # the down runs crossing them, and bands of columns the other way.
+
+    model = self.model
+    found = {}
+    for axis in (0, 1):
+      lines = {}
+      for k, coords in enumerate(model.cells):
+        lines.setdefault(coords[axis], []).append(k)
+      order = sorted(lines)
+      for first in range(len(order)):
+        band = []
+        total = 0
+        crossing = {}           # run crossing the band -> cells inside it
+        for line in order[first:]:
+          for k in lines[line]:
+            along, cross = model.cellRuns[k][axis], model.cellRuns[k][1-axis]
+            if along is None:
+              break
+            band.append(k)
+            if cross is not None:
+              crossing[cross] = crossing.get(cross, 0) + 1
+          else:
+            total += sum(model.runs[idx].clue for idx in
+                         set(model.cellRuns[k][axis] for k in lines[line]))
+            self.bandRemainders(band, total, crossing, found)
+            continue
+          break                 # a cell of the band has no clued run
+    return sorted(found.items())
+
+  def bandRemainders(self, band, total, crossing, found):
+    # Add to found the remainders of a band of cells adding up to total,
+    # crossed by the runs counted in crossing
+
+    runs = self.model.runs
+    inside = [idx for idx, n in crossing.items() if n == len(runs[idx].cells)]
+    if len(band) - sum(len(runs[idx].cells) for idx in inside) <= \
+       REMAINDER_LIMIT:
+      covered = set(k for idx in inside for k in runs[idx].cells)
+      cells = tuple(sorted(k for k in band if k not in covered))
+      if cells:
+        found[cells] = total - sum(runs[idx].clue for idx in inside)
+    if sum(crossing.values()) == len(band) and \
+       sum(len(runs[idx].cells) for idx in crossing) - len(band) <= \
+       REMAINDER_LIMIT:
+      members = set(band)
+      cells = tuple(sorted(k for idx in crossing for k in runs[idx].cells
+                           if k not in members))
+      if cells:
+        found[cells] = sum(runs[idx].clue for idx in crossing) - total
+
+  # Each technique looks for a deduction in the given candidates.  It
+  # returns a Deduction, not yet applied, or None.
+
+  def restrict(self, technique, idx, candidates, masks):
+    # A Deduction narrowing the cells of run idx to masks, or None if that
+    # removes nothing
+
+    eliminated = {}
+    for c, m in zip(self.runs[idx], masks):
+      removed = candidates[c] & ~m
+      if removed:
+        eliminated[c] = removed
+    if eliminated:
+      return Deduction(technique, idx, eliminated)
+    return None
+
+  def uniqueCombination(self, candidates):
+    for idx, cells in enumerate(self.runs):
+      if len(self.combos[idx].masks) == 1:
+        only = self.combos[idx].masks[0]
+        found = self.restrict('unique combination', idx, candidates,
+                              [only] * len(cells))
+        if found:
+          return found
+    return None
+
+  def nakedSingle(self, candidates):
+    # A digit placed twice in a run is eliminated from both cells, which
+    # shows the contradiction
+
+    for idx, cells in enumerate(self.runs):
+      placed = twice = 0
+      for c in cells:
+        if POPCOUNT[candidates[c]] == 1:
+          twice |= placed & candidates[c]
+          placed |= candidates[c]
+      if placed:
+        masks = [m & ~twice if POPCOUNT[m] == 1 else m & ~placed
+                 for m in (candidates[c] for c in cells)]
+        found = self.restrict('naked single', idx, candidates, masks)
+        if found:
+          return found
+    return None
+
+  def placeRequired(self, technique, idx, candidates, must):
+    # Place each digit of must that only one cell of run idx can hold
+
+    cells = self.runs[idx]
+    masks = [candidates[c] for c in cells]
+    for d in DIGITS[must]:
+      b = 1 << (d-1)
+      holders = [k for k, m in enumerate(masks) if m & b]
+      if len(holders) == 1:
+        masks[holders[0]] = b
+    return self.restrict(technique, idx, candidates, masks)
+
+  def hiddenSingle(self, candidates):
+    for idx in range(len(self.runs)):
+      if self.combos[idx].must:
+        found = self.placeRequired('hidden single', idx, candidates,
+                                   self.combos[idx].must)
+        if found:
+          return found
+    return None
+
+  def liveCombos(self, idx, candidates):
+    # The combinations of run idx that every cell can take a digit of, and
+    # whose digits can all be placed
+
+    masks = [candidates[c] for c in self.runs[idx]]
+    live = []
+    for combo in self.combos[idx].masks:
+      cover = 0
+      for m in masks:
+        hit = m & combo
+        if not hit:
+          break
+        cover |= hit
+      else:
+        if cover == combo:
+          live.append(combo)
+    return live
+
+  def combinationElimination(self, candidates):
+    for idx, cells in enumerate(self.runs):
+      union = 0
+      for combo in self.liveCombos(idx, candidates):
+        union |= combo
+      found = self.restrict('combination elimination', idx, candidates,
+                            [union] * len(cells))
+      if found:
+        return found
+    return None
+
+  def combinationIntersection(self, candidates):
+    for idx in range(len(self.runs)):
+      live = self.liveCombos(idx, candidates)
+      if not live:
+        continue
+      must = live[0]
+      for combo in live[1:]:
+        must &= combo
+      found = self.placeRequired('combination intersection', idx,
+                                 candidates, must)
+      if found:
+        return found
+    return None
+
+  def nakedSubset(self, candidates):
+    for idx, cells in enumerate(self.runs):
+      unfixed = [c for c in cells if POPCOUNT[candidates[c]] > 1]
+      for size in range(2, min(SUBSET_LIMIT, len(unfixed)-1) + 1):
+        for subset in combinations(unfixed, size):
+          union = 0
+          for c in subset:
+            union |= candidates[c]
+          if POPCOUNT[union] != size:
+            continue
+          masks = [candidates[c] if c in subset else candidates[c] & ~union
+                   for c in cells]
+          found = self.restrict('naked subset', idx, candidates, masks)
+          if found:
+            return found
+    return None
+
+  def supported(self, idx, cell, digit, candidates):
+    # Can the rest of run idx make the remainder of its clue once digit is
+    # placed in cell?
+
+    b = 1 << (digit-1)
+    rest = [candidates[c] & ~b for c in self.runs[idx] if c != cell]
+    for combo in self.combos[idx].masks:
+      if combo & b and matches(rest, combo & ~b):
+        return True
+    return False
+
+  def combinationMatching(self, candidates):
+    for cell, m in enumerate(candidates):
+      if POPCOUNT[m] < 2:
+        continue
+      for idx in self.runsOf[cell]:
+        removed = 0
+        for d in DIGITS[m]:
+          if not self.supported(idx, cell, d, candidates):
+            removed |= 1 << (d-1)
+        if removed:
+          return Deduction('combination matching', idx, {cell: removed})
+    return None
+
+  def sumRemainder(self, candidates):
+    # Each open cell of a remainder can only hold digits that leave a total
+    # the other open cells can make.  Digits may repeat among the others,
+    # since they needn't share a run.
+
+    for cells, total in self.remainders:
+      open = [c for c in cells if POPCOUNT[candidates[c]] > 1]
+      rest = total - sum(DIGITS[candidates[c]][0] for c in cells
+                         if POPCOUNT[candidates[c]] == 1)
+      if not open:
+        if rest:
+          return Deduction('sum remainder', None,
+                           {cells[0]: candidates[cells[0]]})
+        continue
+      eliminated = {}
+      for c in open:
+        sums = set([0])
+        for other in open:
+          if other != c:
+            sums = set(s + d for s in sums for d in DIGITS[candidates[other]])
+        removed = 0
+        for d in DIGITS[candidates[c]]:
+          if rest - d not in sums:
+            removed |= 1 << (d-1)
+        if removed:
+          eliminated[c] = removed
+      if eliminated:
+        return Deduction('sum remainder', None, eliminated)
+    return None
+
+  def nextDeduction(self, candidates):
+    # The deduction the cheapest applicable technique makes, or None.
+    # Useful as a hint.
+
+    for name, tier, method in self.techniques:
+      found = method(candidates)
+      if found:
+        return found
+    return None
+
+  def solve(self, candidates = None):
+    # Apply techniques until the puzzle is solved or none applies, then
+    # search if need be.  Starts from the given candidates, or from none
+    # eliminated.  Returns a LogicResult.
+
+    if candidates is None:
+      candidates = self.initial()
+    else:
+      candidates = candidates[:]
+    deductions = []
+    used = {}
+    tier = 0
+    while True:
+      found = self.nextDeduction(candidates)
+      if found is None:
+        break
+      deductions.append(found)
+      used[found.technique] = used.get(found.technique, 0) + 1
+      tier = max(tier, self.tiers[found.technique])
+      for c, removed in found.eliminated.items():
+        candidates[c] &= ~removed
+      if any(not candidates[c] for c in found.eliminated):
+        return LogicResult(NO_SOLUTION, None, deductions, used, tier,
+                           candidates, 0)
+
+    # Combination elimination has checked every filled run, so a board
+    # with every cell fixed is solved
+
+    nodes = 0
+    if all(POPCOUNT[m] == 1 for m in candidates):
+      solutions = [{v: DIGITS[m][0]
+                    for v, m in zip(self.model.cells, candidates)}]
+    else:
+      used['search'] = 1
+      tier = 4
+      engine = Engine(self.model)
+      solutions = engine.search(candidates[:], 2)
+      nodes = engine.nodes
+    status = (NO_SOLUTION, UNIQUE, MULTIPLE)[min(len(solutions), 2)]
+    solution = solutions[0] if status == UNIQUE else None
+    return LogicResult(status, solution, deductions, used, tier, candidates,
+                       nodes)
+
+def solve(model):
+  return LogicSolver(model).solve()
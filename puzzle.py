@@ -1,6 +1,8 @@
 from pyparsing import oneOf, OneOrMore, Group, Word, nums, Suppress, pythonStyleComment, ParseException
 import time
 import os.path
+from candidates import bit, popcount, lowestDigit, digits, fromDigits
+from candidates import candidateArray
 
 class Checkpoint(object):
   # Used to stop undo rollback
@@ -32,7 +34,6 @@ class Puzzle(object):
     self.solution     = {}
     self.history      = []
     self.answer       = {}
-    self.candidates   = {}
     self.parent       = parent
 
     # use pyparsing to parse input file
@@ -59,9 +60,11 @@ class Puzzle(object):
     for i in range(1, dim+1):
       for j in range(1, dim+1):
         self.answer[(i,j)] = 0
-        self.candidates[(i,j)] = []
 
     # Cells are numbered as (row, col), where 1 <= row, col <= dim
+    # Candidates are bitmasks indexed by cell number; see self.cell
+
+    self.candidates = candidateArray(dim*dim, 0)
 
     for c in p.cages:
       cage = Cage( c.oper, int(c.value), c.cells, int(c.color) )
@@ -88,7 +91,7 @@ class Puzzle(object):
       self.answer[coords(idx)] = int(val)
 
     for idx, val in enumerate(p.candidates):
-      self.candidates[coords(idx)] = [] if val == '0' else [int(c) for c in val]
+      self.candidates[idx] = 0 if val == '0' else fromDigits(int(c) for c in val)
 
     for h in p.history:
       if h == 'checkpoint':
@@ -196,8 +199,26 @@ class Puzzle(object):
         history.append( Update(upd.coords, upd.answer, upd.candidates) )
     return updates
 
+  def cell(self, coords):
+    # Cell number of the cell with the given coordinates
+
+    return (coords[0]-1) * self.dim + coords[1]-1
+
+  def allowed(self, focus):
+    # Mask of the digits not already entered as answers in the same line
+
+    dim, answer = self.dim, self.answer
+    x, y = focus
+    cand = (1 << dim) - 1
+    for k in range(1, dim+1):
+      for coords in ( (x, k), (k, y) ):
+        if answer[coords]:
+          cand &= ~bit(answer[coords])
+    return cand
+
   def annal(self, focus):
-    return Update(focus, self.answer[focus], self.candidates[focus][:])
+    cand = list(digits(self.candidates[self.cell(focus)]))
+    return Update(focus, self.answer[focus], cand)
 
   def propagate(self, focus, value):
     # When an answer is entered in a cell, eliminate that value as a
@@ -220,16 +241,16 @@ class Puzzle(object):
       for coords in ( (x, k), (k, y) ):
         if answer[coords]:
           continue
-        cand = candidates[coords]
-        if  value not in cand:
+        cand = candidates[self.cell(coords)]
+        if not cand & bit(value):
           continue
-        if len(cand) == 2:
-          # the element != value equals sum(cand) - value
-          updates.extend(self.propagate(coords, sum(cand)-value))
+        if popcount(cand) == 2:
+          # the other candidate becomes the answer
+          updates.extend(self.propagate(coords, lowestDigit(cand & ~bit(value))))
         else:
           ann = self.annal(coords)
           history.append(ann)
-          candidates[coords].remove(value)
+          candidates[self.cell(coords)] &= ~bit(value)
           updates.append(self.annal(coords))
     return updates
 
@@ -245,30 +266,21 @@ class Puzzle(object):
     self.isDirty = True
     history.append(Checkpoint())
     history.append(ann)
-    cand = range(1, dim+1)
-    x, y = focus
-    for k in range(1, dim+1):
-      try:
-        cand.remove(answer[x, k])
-      except ValueError:
-        pass
-      try:
-        cand.remove(answer[k, y])
-      except ValueError:
-        pass
-    if len(cand) != 1:
-      self.candidates[focus] = cand
+    cand = self.allowed(focus)
+    if popcount(cand) != 1:
+      self.candidates[self.cell(focus)] = cand
       update = self.annal(focus)
       return [update]                     # only one update
     else:
-      updates =  self.propagate(focus, cand[0])
+      updates =  self.propagate(focus, lowestDigit(cand))
     for upd in updates:
       history.append( Update(upd.coords, upd.answer, upd.candidates) )
     return updates
 
   def fillAllCandidates(self):
-    # For each cell withpout an answer or any candidates, enter
-    # all possible candidates
+    # For each cell without an answer or any candidates, enter
+    # all possible candidates.  A cell with only one possible
+    # digit gets it as its answer, which is propagated.
     # Enter transaction in history and return a list of updates
 
     candidates, answer, history = self.candidates, self.answer, self.history
@@ -280,30 +292,20 @@ class Puzzle(object):
 
     cells = [(x, y) for x in rng for y in rng]
     for cell in cells:
-      if answer[cell] or candidates[cell]:
+      if answer[cell] or candidates[self.cell(cell)]:
         continue
       ann = self.annal(cell)
       history.append(ann)
-      cand = rng[:]
-      x, y = cell
-      for k in rng:
-        try:
-          cand.remove(answer[x, k])
-        except ValueError:
-          pass
-        try:
-            cand.remove(answer[k, y])
-        except ValueError:
-          pass
-    if len(cand) != 1:
-      self.candidates[cell] = cand
-      update = self.annal(cell)
-      updates.append(update)
-    else:
-      ups =  self.propagate(cell, cand[0])
-      updates.extend(ups)
-      for upd in ups:
-        history.append( Update(upd.coords, upd.answer, upd.candidates) )
+      cand = self.allowed(cell)
+      if popcount(cand) != 1:
+        candidates[self.cell(cell)] = cand
+        update = self.annal(cell)
+        updates.append(update)
+      else:
+        ups =  self.propagate(cell, lowestDigit(cand))
+        updates.extend(ups)
+        for upd in ups:
+          history.append( Update(upd.coords, upd.answer, upd.candidates) )
     if not updates:
       history.pop()           # remove the checkpoint
       self.isDirty = dirty    # restore state
@@ -327,11 +329,11 @@ class Puzzle(object):
 
     ann = self.annal(focus)
 
-    if value in candidates[focus]:            # toggle value off
+    if candidates[self.cell(focus)] & bit(value):   # toggle value off
       self.isDirty = True
       history.append(Checkpoint())
       history.append(ann)
-      candidates[focus].remove(value)
+      candidates[self.cell(focus)] &= ~bit(value)
       update = self.annal(focus)
       return [update]                       # only one update
 
@@ -347,7 +349,7 @@ class Puzzle(object):
     self.isDirty = True
     history.append(Checkpoint())              # no conflicts, toggle value on
     history.append(ann)
-    candidates[focus].append(value)
+    candidates[self.cell(focus)] |= bit(value)
     update = self.annal(focus)
     return [update]                           # only one update
 
@@ -361,7 +363,7 @@ class Puzzle(object):
     updates = []
     for j in range(1, dim+1):
       for k in range(1, dim+1):
-        if answer[(j, k)] or candidates[(j, k)]:
+        if answer[(j, k)] or candidates[self.cell((j, k))]:
           updates.append(self.annal( (j, k) ))
     return updates
 
@@ -379,7 +381,7 @@ class Puzzle(object):
     while not isinstance(ann, Checkpoint):
       coords             = ann.coords
       answer[coords]     = ann.answer
-      candidates[coords] = ann.candidates
+      candidates[self.cell(coords)] = fromDigits(ann.candidates)
       updates.append(ann)
       ann                = history.pop()
     return updates
@@ -390,14 +392,14 @@ class Puzzle(object):
     # Return a list of updates
 
     answer, candidates, history = self.answer, self.candidates, self.history
-    if not answer[focus] and not candidates[focus]:
+    if not answer[focus] and not candidates[self.cell(focus)]:
       return []                                # nothing to clear
 
     ann = self.annal(focus)
     if answer[focus]:
       answer[focus] = 0
     else:
-      candidates[focus] = []
+      candidates[self.cell(focus)] = 0
     self.isDirty = True
     history.append(Checkpoint())
     history.append(ann)
@@ -416,11 +418,11 @@ class Puzzle(object):
 
     cells = [(x, y) for x in rng for y in rng]
     for cell in cells:
-      if answer[cell] or not candidates[cell]:
+      if answer[cell] or not candidates[self.cell(cell)]:
         continue         # nothing to clear
       ann = self.annal(cell)
       history.append(ann)
-      candidates[cell] = []
+      candidates[self.cell(cell)] = 0
       updates.append(self.annal(cell))
     if not updates:
       history.pop()           # remove the checkpoint
@@ -472,8 +474,8 @@ class Puzzle(object):
     fout.write('#\nCandidates\n')
     for row in range(1, dim+1):
       for col in range(1, dim+1):
-        cand = self.candidates[(row, col)]
-        cstr = ''.join([str(c) for c in cand])
+        cand = self.candidates[self.cell((row, col))]
+        cstr = ''.join([str(c) for c in digits(cand)])
         fout.write('%s ' % (cstr if cstr else '0') )
       fout.write('\n')
 
@@ -498,7 +500,7 @@ class Puzzle(object):
     dim = self.dim
     for i in range(1, dim+1):
       for j in range(1, dim+1):
-        self.candidates[(i,j)] = []
+        self.candidates[self.cell((i,j))] = 0
         if (i, j) not in self.oneCellCages:
           self.answer[(i,j)] = 0
     self.history = []
@@ -0,0 +1,131 @@
+# rating.py
+# Rate the difficulty of kakuro puzzles from the techniques a person would
+# need to solve them (see logic.py).
+# Usage:
+#   python rating.py [-o report.tsv] [-j jobs] [--sort key] path ...
+# Paths are as for batch.py.  The report has one tab-separated line per
+# puzzle, with a heading line, sorted by --sort (score by default, hardest
+# first), so it can be read by a spreadsheet or sorted again with sort(1).
+#
+# The score of a puzzle is the sum, over the deductions made, of the weight
+# of the tier of each technique, and SEARCH_WEIGHT for each node searched
+# if no technique applied, divided by the number of white squares, so big
+# puzzles aren't rated hard just for their size.  The grade goes by the
+# hardest tier of technique needed (see logic.py):
+#   easy    tier 1: each run's digits are narrowed to the combinations
+#           that fit its clue, and cells are filled as they are forced
+#   medium  tier 2: a digit every combination of a run still needs is
+#           placed in the one cell left for it
+#   hard    tier 3: subsets, sum remainders across bands of runs, or
+#           matching the rest of a run to a combination
+#   expert  tier 4: trial and error
+# Nearly every puzzle needs combinations narrowed, so that is a tier 1
+# technique; otherwise no puzzle would be easy.
+
+import argparse
+import multiprocessing
+import sys
+from collections import namedtuple
+from kro import grid, KroError
+from archive import ArchiveError
+from runs import extractRuns
+from logic import LogicSolver, TECHNIQUES
+from batch import puzzleSources, loadPuzzle
+
+TIER_WEIGHTS = {1: 1.0, 2: 3.0, 3: 10.0}
+SEARCH_WEIGHT = 50.0
+GRADES = {0: 'easy', 1: 'easy', 2: 'medium', 3: 'hard', 4: 'expert'}
+SORT_KEYS = (['file', 'grade', 'score', 'tier', 'nodes', 'status'] +
+             [name for name, tier, method in TECHNIQUES] + ['search'])
+
+# status is as for kakuroCSP.solve; used maps techniques to the deductions
+# they made, and nodes is the number searched
+
+Rating = namedtuple('Rating', 'grade score tier used nodes status')
+
+def rate(model):
+  # The Rating of the puzzle with the given RunModel
+
+  solver = LogicSolver(model)
+  result = solver.solve()
+  total = sum(TIER_WEIGHTS[solver.tiers[d.technique]]
+              for d in result.deductions)
+  total += SEARCH_WEIGHT * result.nodes
+  score = total / max(1, len(model.cells))
+  return Rating(GRADES[result.tier], score, result.tier, result.used,
+                result.nodes, result.status)
+
+def ratePuzzle(source):
+  # Worker function: rate the puzzle source (as returned by
+  # batch.puzzleSources).  Returns a dict, with an error entry if the
+  # puzzle couldn't be read or has impossible clues.
+
+  try:
+    label, puzzle = loadPuzzle(source)
+  except (IOError, OSError, KroError, ArchiveError) as x:
+    return {'file': str(source), 'error': str(x)}
+  model = extractRuns(*grid(puzzle))
+  if model.contradictions:
+    return {'file': label, 'error': 'impossible clues'}
+  rating = rate(model)
+  row = {'file': label, 'grade': rating.grade, 'score': rating.score,
+         'tier': rating.tier, 'nodes': rating.nodes, 'status': rating.status}
+  row.update(rating.used)
+  return row
+
+def rateAll(sources, jobs = 1, chunksize = 4):
+  # A list of the rows of ratePuzzle for the puzzle sources, in order
+
+  if jobs == 1:
+    return [ratePuzzle(source) for source in sources]
+  pool = multiprocessing.Pool(jobs)
+  try:
+    rows = pool.map(ratePuzzle, sources, chunksize)
+    pool.close()
+  finally:
+    pool.terminate()
+    pool.join()
+  return rows
+
+def writeReport(fout, rows, sortKey = 'score'):
+  # Write rows as tab-separated text, sorted on sortKey, largest first for
+  # numbers.  Puzzles that couldn't be rated come last.
+
+  techniques = [name for name, tier, method in TECHNIQUES] + ['search']
+  columns = ['file', 'grade', 'score', 'tier', 'nodes', 'status']
+  rated = [row for row in rows if 'error' not in row]
+  if sortKey == 'grade':
+    sortKey = 'tier'                    # the grades in order of difficulty
+  numeric = sortKey in ('score', 'tier', 'nodes') or sortKey in techniques
+  rated.sort(key = lambda row: row.get(sortKey, 0), reverse = numeric)
+  fout.write('\t'.join(columns + techniques + ['error']) + '\n')
+  for row in rated + [row for row in rows if 'error' in row]:
+    fields = []
+    for column in columns + techniques + ['error']:
+      value = row.get(column, 0 if column in techniques else '')
+      fields.append('%.3f' % value if column == 'score' and value != ''
+                    else str(value))
+    fout.write('\t'.join(fields) + '\n')
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = 'Rate kakuro puzzles')
+  parser.add_argument('paths', nargs = '+',
+                      help = '.kro files, archives, directories or globs')
+  parser.add_argument('-o', '--output', help = 'write the report to this file')
+  parser.add_argument('-j', '--jobs', type = int, default = 1,
+                      help = 'number of worker processes (0 for one per CPU)')
+  parser.add_argument('--sort', default = 'score', choices = SORT_KEYS,
+                      help = 'column to sort on (default score)')
+  args = parser.parse_args(argv)
+  jobs = args.jobs or multiprocessing.cpu_count()
+
+  rows = rateAll(puzzleSources(args.paths), jobs)
+  fout = open(args.output, 'w') if args.output else sys.stdout
+  try:
+    writeReport(fout, rows, args.sort)
+  finally:
+    if fout is not sys.stdout:
+      fout.close()
+
+if __name__ == '__main__':
+  main()
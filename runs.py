@@ -0,0 +1,88 @@
+# runs.py
+# The run structure of a kakuro grid, shared by the validator (sanityCheck)
+# and the solver.
+# White squares are numbered in row-major order.  Each clued run gets an id,
+# its index in RunModel.runs.  RunModel.cellRuns maps each cell number to
+# the ids of its (across, down) runs, with None where the cell has no
+# clued run in that direction.
+
+from collections import namedtuple
+from combos import isPossible
+
+ACROSS = 'across'
+DOWN   = 'down'
+
+# black is the coords of the black square holding the clue, and cells is a
+# tuple of cell numbers
+
+Run = namedtuple('Run', 'black direction clue cells')
+
+class RunModel(object):
+  def __init__(self, cells, runs):
+    # cells is a list of the coords of the white squares, runs a list of Run
+
+    self.cells = cells
+    self.index = {v: k for k, v in enumerate(cells)}
+    self.runs = runs
+    self.contradictions = []
+    cellRuns = [[None, None] for v in cells]
+    for idx, run in enumerate(runs):
+      slot = 0 if run.direction == ACROSS else 1
+      for k in run.cells:
+        cellRuns[k][slot] = idx
+    self.cellRuns = [tuple(pair) for pair in cellRuns]
+
+  def runsOf(self, cell):
+    # Ids of the clued runs through the given cell number
+
+    return [idx for idx in self.cellRuns[cell] if idx is not None]
+
+  def coords(self, run):
+    # The white squares of a run, as coords
+
+    return [self.cells[k] for k in run.cells]
+
+def extractRuns(rows, cols, across, down):
+  # Build the RunModel of a grid in one sweep.
+  # across and down are as described in kakuroCSP.sanityCheck.  Squares
+  # in row rows or column cols count as black whether or not the sentinels
+  # are present.
+  # Impossible clues are recorded in the model's contradictions list, as
+  # (row, col, clue, length) tuples.
+
+  cells, runs, impossible = [], [], []
+
+  def close(run):
+    if run is None:
+      return
+    r, c, direction, clue, members = run
+    if clue == 0:
+      return
+    runs.append(Run((r, c), direction, clue, tuple(members)))
+    if not isPossible(clue, len(members)):
+      impossible.append((r, c, clue, len(members)))
+
+  openDown = [None] * cols          # run being extended in each column
+  for r in range(rows+1):
+    openAcross = None
+    for c in range(cols+1):
+      if r >= rows or c >= cols or (r, c) in across:
+        close(openAcross)
+        openAcross = None
+        if c < cols:
+          close(openDown[c])
+          openDown[c] = None
+        if r < rows and c < cols:
+          openAcross = [r, c, ACROSS, across[r, c], []]
+          openDown[c] = [r, c, DOWN, down.get((r, c), 0), []]
+      else:
+        k = len(cells)
+        cells.append((r, c))
+        if openAcross is not None:
+          openAcross[4].append(k)
+        if openDown[c] is not None:
+          openDown[c][4].append(k)
+
+  model = RunModel(cells, runs)
+  model.contradictions = impossible
+  return model
@@ -0,0 +1,164 @@
+# solvecache.py
+# A persistent cache of uniqueness checks, so a puzzle checked once is
+# looked up rather than solved again, whether it is reopened, checked in
+# another batch run, or saved transposed, turned or reflected.
+# Results are kept in an sqlite database, keyed by canonical.fingerprint.
+# Each entry holds the status, the number of solutions found (at most 2,
+# as for kakuroCSP.solve) and the solution if it is unique, in the
+# orientation of the canonical form.  When the cache holds more than its
+# size, the entries used least recently are evicted.  Checks cut short by
+# a deadline or cancel token are not cached.
+# The time an entry was last used is updated in batches of TOUCHES
+# lookups, when an entry is stored and when the cache is closed, rather
+# than on every lookup.
+# Several processes can share a cache.  Each waits up to timeout seconds
+# for the others' locks; if the database is still locked, checkPuzzle
+# solves the puzzle without the cache.
+
+import json
+import sqlite3
+import time
+from canonical import fingerprint, mapCoords, restoreCoords
+from kro import grid
+from runs import extractRuns
+from kakuroCSP import solve, NO_SOLUTION, UNIQUE, MULTIPLE
+
+SIZE = 100000           # default number of entries kept
+TOUCHES = 100           # lookups between updates of the use times
+TIMEOUT = 10.0          # default seconds to wait for a locked database
+
+class SolveCache(object):
+  def __init__(self, fname, size = SIZE, timeout = TIMEOUT):
+    self.size = size
+    self.touched = {}           # key -> time of lookups not yet written
+    self.lookups = 0            # lookups since the use times were written
+    self.db = sqlite3.connect(fname, timeout = timeout)
+    self.db.execute('create table if not exists results '
+                    '(key text primary key, status text, count integer, '
+                    'solution text, used real)')
+    self.db.execute('create index if not exists byUse on results (used)')
+    self.evict()
+    self.db.commit()
+
+  def get(self, puzzle):
+    # Returns (status, count, solution) for a kro.KroPuzzle, the solution
+    # being a dict mapping coords to digits in the puzzle's own orientation,
+    # or None if the puzzle isn't in the cache
+
+    key, symmetry = fingerprint(puzzle)
+    row = self.db.execute('select status, count, solution from results '
+                          'where key = ?', (key,)).fetchone()
+    if row is None:
+      return None
+    self.touched[key] = time.time()
+    self.lookups += 1
+    if self.lookups >= TOUCHES:
+      self.flush()
+    status, count, text = row
+    solution = {}
+    for r, c, d in json.loads(text):
+      solution[restoreCoords((r, c), symmetry, puzzle.rows, puzzle.cols)] = d
+    return status, count, solution
+
+  def put(self, puzzle, status, count, solution = None):
+    key, symmetry = fingerprint(puzzle)
+    cells = sorted(list(mapCoords(coords, symmetry, puzzle.rows, puzzle.cols))
+                   + [d] for coords, d in (solution or {}).items())
+    self.touched.pop(key, None)
+    try:
+      self.db.execute('insert or replace into results values '
+                      '(?, ?, ?, ?, ?)',
+                      (key, status, count, json.dumps(cells), time.time()))
+      self.writeTouched()
+      self.evict()
+      self.db.commit()
+    except sqlite3.OperationalError:
+      self.db.rollback()
+      raise
+    self.touched, self.lookups = {}, 0
+
+  def flush(self):
+    # Write the use times of the entries looked up since the last write
+
+    if self.touched:
+      try:
+        self.writeTouched()
+        self.db.commit()
+      except sqlite3.OperationalError:
+        self.db.rollback()
+        raise
+      self.touched, self.lookups = {}, 0
+
+  def writeTouched(self):
+    self.db.executemany('update results set used = ? where key = ?',
+                        [(used, key) for key, used in self.touched.items()])
+
+  def evict(self):
+    count = self.db.execute('select count(*) from results').fetchone()[0]
+    if count > self.size:
+      self.db.execute('delete from results where key in (select key from '
+                      'results order by used limit ?)', (count - self.size,))
+
+  def __len__(self):
+    return self.db.execute('select count(*) from results').fetchone()[0]
+
+  def close(self):
+    # Write the use times if the database can be had, and close it
+
+    try:
+      self.flush()
+    except sqlite3.OperationalError:
+      pass
+    self.db.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+def lookupCheck(puzzle, cache):
+  # The uniqueness check of a kro.KroPuzzle found in cache, as checkPuzzle
+  # returns it, or None if it isn't there, there is no cache or the cache
+  # is locked
+
+  if cache is None:
+    return None
+  try:
+    found = cache.get(puzzle)
+  except sqlite3.OperationalError:
+    return None
+  if found is None:
+    return None
+  status, count, solution = found
+  return status, count, solution or None, True, None
+
+def storeCheck(puzzle, cache, outcome):
+  # The uniqueness check of a kro.KroPuzzle from outcome, a
+  # kakuroCSP.SolveResult, as checkPuzzle returns it.  Conclusive outcomes
+  # are stored in cache if there is one and it isn't locked.
+
+  status, witnesses, stats = outcome
+  solution = witnesses[0] if status == UNIQUE else None
+  if cache is not None and status in (NO_SOLUTION, UNIQUE, MULTIPLE):
+    try:
+      cache.put(puzzle, status, len(witnesses), solution)
+    except sqlite3.OperationalError:
+      pass
+  return status, len(witnesses), solution, False, stats
+
+def checkPuzzle(puzzle, cache = None, deadline = None, cancel = None,
+                model = None):
+  # The uniqueness check of a kro.KroPuzzle, looked up in cache if it has
+  # one.  model is the puzzle's RunModel, if it has been made already.
+  # Returns (status, count, solution, cached, stats), solution being None
+  # unless status is UNIQUE, and stats the solver's statistics (see
+  # engine.py), or None if the check was cached.
+
+  check = lookupCheck(puzzle, cache)
+  if check is None:
+    if model is None:
+      model = extractRuns(*grid(puzzle))
+    check = storeCheck(puzzle, cache, solve(model, deadline = deadline,
+                                            cancel = cancel))
+  return check
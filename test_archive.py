@@ -0,0 +1,96 @@
+# test_archive.py
+# Puzzles come out of an archive as they went in, and damaged or hostile
+# archives raise ArchiveError.
+
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+from kro import readKro
+from archive import (Archive, ArchiveError, writeArchive, packFiles,
+                     unpackFiles, HEADER, ENTRY)
+
+class ArchiveTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.fname = os.path.join(self.directory, 'puzzles.kar')
+    self.files = sorted(glob.glob('docs/*.kro'))
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def testRoundTrip(self):
+    self.assertEqual(packFiles(self.fname, self.files), len(self.files))
+    with Archive(self.fname) as archive:
+      self.assertEqual(len(archive), len(self.files))
+      for fname, (name, puzzle) in zip(self.files, archive):
+        self.assertEqual(name, os.path.basename(fname))
+        self.assertEqual(puzzle, readKro(fname))
+    out = os.path.join(self.directory, 'out')
+    os.mkdir(out)
+    self.assertEqual(unpackFiles(self.fname, out), len(self.files))
+    for fname in self.files:
+      self.assertEqual(readKro(os.path.join(out, os.path.basename(fname))),
+                       readKro(fname))
+
+  def testNames(self):
+    # Names are reduced to their last component, and names that can't be
+    # files are refused
+
+    out = os.path.join(self.directory, 'out')
+    os.mkdir(out)
+    puzzle = readKro(self.files[0])
+    writeArchive(self.fname, [('../escaped.kro', puzzle), ('', puzzle),
+                              ('/tmp/x/absolute.kro', puzzle)])
+    self.assertEqual(unpackFiles(self.fname, out), 3)
+    self.assertEqual(sorted(os.listdir(out)),
+                     ['1.kro', 'absolute.kro', 'escaped.kro'])
+    self.assertFalse(os.path.exists(os.path.join(self.directory,
+                                                 'escaped.kro')))
+    for name in ('..', 'puzzles/', '.'):
+      writeArchive(self.fname, [(name, puzzle)])
+      self.assertRaises(ArchiveError, unpackFiles, self.fname, out)
+
+  def testSameNames(self):
+    # Puzzles that would land in the same file are refused, packing or
+    # unpacking, rather than one overwriting the other
+
+    other = os.path.join(self.directory, 'other')
+    os.mkdir(other)
+    copy = os.path.join(other, os.path.basename(self.files[0]))
+    shutil.copy(self.files[0], copy)
+    self.assertRaises(ArchiveError, packFiles, self.fname,
+                      [self.files[0], copy])
+    out = os.path.join(self.directory, 'out')
+    os.mkdir(out)
+    puzzle = readKro(self.files[0])
+    writeArchive(self.fname, [('a/x.kro', puzzle), ('1.kro', puzzle),
+                              ('b/x.kro', puzzle)])
+    self.assertRaises(ArchiveError, unpackFiles, self.fname, out)
+    writeArchive(self.fname, [('x.kro', puzzle), ('', puzzle),
+                              ('1.kro', puzzle)])
+    self.assertRaises(ArchiveError, unpackFiles, self.fname, out)
+    self.assertEqual(os.listdir(out), [])
+
+  def testTruncated(self):
+    # Every prefix of an archive either reads in full or raises ArchiveError
+
+    writeArchive(self.fname, [(os.path.basename(f), readKro(f))
+                              for f in self.files[:2]])
+    with open(self.fname, 'rb') as fin:
+      data = fin.read()
+    short = os.path.join(self.directory, 'short.kar')
+    for length in range(len(data)):
+      with open(short, 'wb') as fout:
+        fout.write(data[:length])
+      try:
+        with Archive(short) as archive:
+          self.assertTrue(length >= HEADER.size + ENTRY.size * len(archive))
+          list(archive)
+      except ArchiveError:
+        continue
+      self.fail('%d bytes of %d read in full' % (length, len(data)))
+
+if __name__ == '__main__':
+  unittest.main()
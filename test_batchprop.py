@@ -0,0 +1,74 @@
+# test_batchprop.py
+# The batch propagation must agree with each puzzle's own engine.
+
+import random
+import unittest
+import batchprop
+from kro import KroPuzzle, grid
+from runs import extractRuns
+from engine import Engine
+from kakuroCSP import solve
+from generator import layout, fill, clues
+
+def randomModels(count, seed, nudge = 0.0):
+  # RunModels of count random puzzles.  With probability nudge, a clue of a
+  # puzzle is changed, which usually leaves it with no solution.
+
+  rng = random.Random(seed)
+  models = []
+  while len(models) < count:
+    rows, cols = rng.randint(3, 6), rng.randint(3, 6)
+    whites = layout(rows, cols, 0.3, 'none', 9, rng)
+    digits = whites and fill(whites, rows, cols, rng)
+    if not digits:
+      continue
+    found = clues(whites, digits, rows, cols)
+    if rng.random() < nudge:
+      b = rng.choice([b for b, (a, d) in sorted(found.items()) if a or d])
+      found[b] = tuple(clue and clue + rng.choice((-3, -2, -1, 1, 2, 3))
+                       for clue in found[b])
+    model = extractRuns(*grid(KroPuzzle(rows, cols, found, {})))
+    if not model.contradictions:
+      models.append(model)
+  return models
+
+class BatchPropagationTest(unittest.TestCase):
+  def check(self):
+    # Nudged puzzles, some of which propagation shows impossible, for the
+    # propagation, and whole puzzles, which have solutions and can be
+    # searched quickly, for the search
+
+    models = randomModels(150, 1, 1.0)
+    expected = [Engine(model).reduced() for model in models]
+    self.assertEqual(batchprop.propagateBatch(models), expected)
+    self.assertTrue(any(c is None for c in expected))
+
+    # Every run of a puzzle with no contradiction is revised at least once
+
+    reduced, revisions = batchprop.propagateCounted(models)
+    self.assertEqual(reduced, expected)
+    for model, candidates, revised in zip(models, reduced, revisions):
+      self.assertTrue(revised >= len(model.runs) or candidates is None)
+
+    models = randomModels(100, 2)
+    for model, result in zip(models, batchprop.solveBatch(models)):
+      status, solutions, stats = solve(model)
+      self.assertEqual(result.status, status)
+      self.assertTrue(result.stats['propagations'] >= len(model.runs))
+      if status == 'unique':
+        self.assertEqual(result.solutions, solutions)
+
+  def testNumPy(self):
+    if batchprop.np is None:
+      self.skipTest('NumPy is not installed')
+    self.check()
+
+  def testWithoutNumPy(self):
+    np, batchprop.np = batchprop.np, None
+    try:
+      self.check()
+    finally:
+      batchprop.np = np
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,80 @@
+# test_canonical.py
+# A puzzle turned or reflected any of the eight ways is recognised as the
+# same puzzle, by its fingerprint, by dedup and by the solve cache.
+
+import os
+import shutil
+import tempfile
+import unittest
+from kro import KroPuzzle, KroError, readKro, writeKro, grid
+from archive import ArchiveError, packPuzzle, unpackPuzzle
+from runs import extractRuns
+from kakuroCSP import solve
+from canonical import SYMMETRIES, transform, fingerprint, layoutKey
+from dedup import DuplicateIndex
+from solvecache import SolveCache, checkPuzzle
+
+class CanonicalTest(unittest.TestCase):
+  def setUp(self):
+    self.puzzle = readKro('docs/M44252.kro')
+    self.forms = [transform(self.puzzle, symmetry) for symmetry in SYMMETRIES]
+
+  def testForms(self):
+    # Each form is a different board with the same fingerprint and layout,
+    # solved by the moved solution
+
+    self.assertEqual(len(set(map(repr, self.forms))), 8)
+    key = fingerprint(self.puzzle)[0]
+    layout = layoutKey(self.puzzle)[0]
+    for form in self.forms:
+      self.assertEqual(fingerprint(form)[0], key)
+      self.assertEqual(layoutKey(form)[0], layout)
+      status, solutions, stats = solve(extractRuns(*grid(form)))
+      self.assertEqual((status, solutions), ('unique', [form.solution]))
+
+  def testDedup(self):
+    index = DuplicateIndex()
+    self.assertEqual(index.add('original', self.puzzle), (None, []))
+    for k, form in enumerate(self.forms):
+      self.assertEqual(index.add('form %d' % k, form), ('original', []))
+    self.assertEqual(len(index), 1)
+
+  def testCacheRestore(self):
+    # A solution cached for one form comes back in the orientation of each
+    # of the others
+
+    directory = tempfile.mkdtemp()
+    try:
+      with SolveCache(os.path.join(directory, 'cache.db')) as cache:
+        checkPuzzle(self.forms[5], cache)
+        for form in self.forms:
+          status, count, solution, cached, stats = checkPuzzle(form, cache)
+          self.assertEqual((status, count, cached), ('unique', 1, True))
+          self.assertEqual(solution, form.solution)
+        self.assertEqual(len(cache), 1)
+    finally:
+      shutil.rmtree(directory)
+
+  def testStrayClues(self):
+    # A clue with no run would be lost from every form, so it is refused
+    # by transform and by the readers
+
+    square = next((r, c) for r, c in sorted(self.puzzle.clues)
+                  if r and (r, c+1) in self.puzzle.clues)
+    clues = dict(self.puzzle.clues)
+    clues[square] = (7, clues[square][1])
+    stray = KroPuzzle(self.puzzle.rows, self.puzzle.cols, clues,
+                      self.puzzle.solution)
+    self.assertRaises(ValueError, transform, stray, SYMMETRIES[0])
+    directory = tempfile.mkdtemp()
+    try:
+      fname = os.path.join(directory, 'stray.kro')
+      with open(fname, 'w') as fout:
+        writeKro(fout, stray, 'stray')
+      self.assertRaises(KroError, readKro, fname)
+    finally:
+      shutil.rmtree(directory)
+    self.assertRaises(ArchiveError, unpackPuzzle, packPuzzle(stray))
+
+if __name__ == '__main__':
+  unittest.main()
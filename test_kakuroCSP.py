@@ -0,0 +1,120 @@
+# test_kakuroCSP.py
+# Solve jobs finish, and tell their waiters and callbacks, however the
+# solve ends.  Every backend finds the same solutions.
+
+import glob
+import random
+import unittest
+from kro import KroPuzzle, readKro, grid
+from runs import extractRuns
+from generator import layout, fill, clues
+from engine import Engine
+from cdcl import CDCLEngine
+from kakuroCSP import solve, SolveJob, BACKENDS, UNIQUE, CANCELLED, ERROR
+
+class Failing(object):
+  # An engine whose solve raises
+
+  nodes = propagations = 0
+
+  def solve(self, limit, deadline, cancel):
+    raise RuntimeError('broken engine')
+
+class SolveJobTest(unittest.TestCase):
+  def setUp(self):
+    self.model = extractRuns(*grid(readKro('docs/M44252.kro')))
+    self.called = []
+
+  def testUnique(self):
+    job = SolveJob(self.model)
+    job.addDoneCallback(self.called.append)
+    job.start()
+    self.assertTrue(job.wait(30))
+    self.assertEqual(job.result()[0], UNIQUE)
+    self.assertEqual(len(job.solutions), 1)
+    self.assertEqual(self.called, [job])
+
+  def testCancelled(self):
+    job = SolveJob(self.model, allSolutions = True)
+    job.cancel()
+    job.run()
+    self.assertEqual(job.status, CANCELLED)
+
+  def testError(self):
+    job = SolveJob(self.model)
+    job.engine = Failing()
+    job.addDoneCallback(self.called.append)
+    job.start()
+    self.assertTrue(job.wait(30))
+    self.assertEqual(job.result(), (ERROR, []))
+    self.assertTrue(isinstance(job.error, RuntimeError))
+    self.assertEqual(self.called, [job])
+    job.addDoneCallback(self.called.append)
+    self.assertEqual(self.called, [job, job])
+
+class BackendTest(unittest.TestCase):
+  def solutions(self, model, backend, allSolutions):
+    status, solutions, stats = solve(model, allSolutions, backend = backend)
+    return status, sorted(sorted(s.items()) for s in solutions)
+
+  def testDocs(self):
+    for fname in sorted(glob.glob('docs/*.kro')):
+      puzzle = readKro(fname)
+      model = extractRuns(*grid(puzzle))
+      for backend in BACKENDS:
+        self.assertEqual(self.solutions(model, backend, False),
+                         (UNIQUE, [sorted(puzzle.solution.items())]),
+                         (fname, backend))
+
+  def testRandom(self):
+    # Small puzzles, each with a clue changed, with all their solutions
+
+    rng = random.Random(3)
+    count = 0
+    while count < 60:
+      rows, cols = rng.randint(2, 4), rng.randint(2, 4)
+      whites = layout(rows, cols, 0.3, 'none', 9, rng)
+      digits = whites and fill(whites, rows, cols, rng)
+      if not digits:
+        continue
+      found = clues(whites, digits, rows, cols)
+      black = rng.choice(sorted(found))
+      found[black] = tuple(clue and max(1, clue + rng.randint(-2, 2))
+                           for clue in found[black])
+      model = extractRuns(*grid(KroPuzzle(rows, cols, found, {})))
+      if model.contradictions:
+        continue
+      expected = self.solutions(model, 'engine', True)
+      if len(expected[1]) > 100:
+        continue                # cdcl is slow to enumerate (see cdcl.py)
+      for backend in BACKENDS[1:]:
+        self.assertEqual(self.solutions(model, backend, True), expected,
+                         (count, backend))
+      count += 1
+
+  def testReuse(self):
+    # A CDCLEngine solved again gives the same solutions, the nogoods
+    # ruling out those already found being dropped
+
+    rng = random.Random(5)
+    for trial in range(30):
+      rows, cols = rng.randint(2, 4), rng.randint(2, 4)
+      whites = layout(rows, cols, 0.3, 'none', 9, rng)
+      digits = whites and fill(whites, rows, cols, rng)
+      if not digits:
+        continue
+      found = clues(whites, digits, rows, cols)
+      black = rng.choice(sorted(found))
+      found[black] = tuple(clue and max(1, clue + rng.randint(-2, 2))
+                           for clue in found[black])
+      model = extractRuns(*grid(KroPuzzle(rows, cols, found, {})))
+      if model.contradictions:
+        continue
+      count = len(Engine(model).solve())
+      engine = CDCLEngine(model)
+      self.assertEqual(len(engine.solve()), count)
+      self.assertEqual(len(engine.solve()), count)
+      self.assertEqual(len(engine.solve(2)), min(2, count))
+
+if __name__ == '__main__':
+  unittest.main()
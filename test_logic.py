@@ -0,0 +1,55 @@
+# test_logic.py
+# The techniques of the logical solver never eliminate a digit of a
+# solution, and the sum remainders are the totals of their cells.
+
+import glob
+import random
+import unittest
+from kro import KroPuzzle, readKro, grid
+from runs import extractRuns
+from generator import layout, fill, clues
+from logic import LogicSolver
+
+class LogicSolverTest(unittest.TestCase):
+  def check(self, model, solution):
+    # Solve, checking every deduction against solution, a dict mapping
+    # coords to digits.  Returns the LogicResult.
+
+    solver = LogicSolver(model)
+    digits = [solution[v] for v in model.cells]
+    for cells, total in solver.remainders:
+      self.assertEqual(sum(digits[c] for c in cells), total)
+    result = solver.solve()
+    for deduction in result.deductions:
+      for c, removed in deduction.eliminated.items():
+        self.assertFalse(removed >> (digits[c]-1) & 1, deduction)
+    return result
+
+  def testDocs(self):
+    used = 0
+    for fname in sorted(glob.glob('docs/*.kro')):
+      puzzle = readKro(fname)
+      result = self.check(extractRuns(*grid(puzzle)), puzzle.solution)
+      self.assertEqual(result.status, 'unique')
+      self.assertEqual(result.solution, puzzle.solution)
+      used += result.used.get('sum remainder', 0)
+    self.assertTrue(used)
+
+  def testRandom(self):
+    # Random fillings, which may have other solutions too
+
+    rng = random.Random(7)
+    count = 0
+    while count < 40:
+      rows, cols = rng.randint(4, 9), rng.randint(4, 9)
+      whites = layout(rows, cols, 0.25, 'none', 9, rng)
+      digits = whites and fill(whites, rows, cols, rng)
+      if not digits:
+        continue
+      puzzle = KroPuzzle(rows, cols, clues(whites, digits, rows, cols), {})
+      result = self.check(extractRuns(*grid(puzzle)), digits)
+      self.assertNotEqual(result.status, 'no solution')
+      count += 1
+
+if __name__ == '__main__':
+  unittest.main()
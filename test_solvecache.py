@@ -0,0 +1,103 @@
+# test_solvecache.py
+# The solve cache, and batch validation through it.
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import batch
+import solvecache
+from kro import readKro
+from solvecache import SolveCache, checkPuzzle
+
+PUZZLES = ['docs/M44252.kro', 'docs/M84261.kro', 'docs/one.kro']
+
+class SolveCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.fname = os.path.join(self.directory, 'cache.db')
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def testCheckPuzzle(self):
+    puzzle = readKro(PUZZLES[0])
+    with SolveCache(self.fname) as cache:
+      status, count, solution, cached, stats = checkPuzzle(puzzle, cache)
+      self.assertEqual((status, count, cached), ('unique', 1, False))
+      self.assertEqual(solution, puzzle.solution)
+      self.assertEqual(checkPuzzle(puzzle, cache),
+                       (status, count, solution, True, None))
+
+  def testUseTimesBatched(self):
+    # Lookups only write their use times every TOUCHES lookups, or when
+    # the cache is closed
+
+    puzzle = readKro(PUZZLES[0])
+    with SolveCache(self.fname) as cache:
+      checkPuzzle(puzzle, cache)
+      used = cache.db.execute('select used from results').fetchone()[0]
+      for k in range(solvecache.TOUCHES - 1):
+        cache.get(puzzle)
+      self.assertEqual(
+        cache.db.execute('select used from results').fetchone()[0], used)
+      cache.get(puzzle)
+      self.assertEqual(cache.touched, {})
+      self.assertTrue(
+        cache.db.execute('select used from results').fetchone()[0] > used)
+      cache.get(puzzle)
+      touched = cache.touched
+    with SolveCache(self.fname) as cache:
+      self.assertEqual(
+        cache.db.execute('select used from results').fetchone()[0],
+        list(touched.values())[0])
+
+  def testLocked(self):
+    # With the database locked by another connection, puzzles are solved
+    # without the cache
+
+    puzzle = readKro(PUZZLES[0])
+    with SolveCache(self.fname, timeout = 0.01) as cache:
+      checkPuzzle(puzzle, cache)
+      other = sqlite3.connect(self.fname)
+      other.execute('begin exclusive')
+      try:
+        status, count, solution, cached, stats = checkPuzzle(puzzle, cache)
+        self.assertEqual((status, count, cached), ('unique', 1, False))
+        self.assertEqual(solution, puzzle.solution)
+        other.rollback()
+        other.execute('delete from results')
+        other.commit()
+        other.execute('begin exclusive')
+        checkPuzzle(puzzle, cache)
+      finally:
+        other.rollback()
+        other.close()
+      self.assertEqual(len(cache), 0)
+
+  def testBatch(self):
+    # Batch validation gives the same results cached or not, one at a time
+    # or in groups
+
+    for size in (0, 2):
+      fname = os.path.join(self.directory, 'batch%d.db' % size)
+      first = list(batch.validateAll(PUZZLES, cacheFile = fname,
+                                     batch = size))
+      second = list(batch.validateAll(PUZZLES, cacheFile = fname,
+                                      batch = size))
+      for before, after in zip(first, second):
+        self.assertEqual((before['status'], before['solutions'],
+                          before['matchesFile']),
+                         ('unique', 1, True))
+        self.assertFalse('cached' in before)
+        self.assertTrue(after['cached'])
+        self.assertEqual((after['status'], after['solutions'],
+                          after['matchesFile']),
+                         ('unique', 1, True))
+    for cache in batch.caches.values():
+      cache.close()
+    batch.caches.clear()
+
+if __name__ == '__main__':
+  unittest.main()
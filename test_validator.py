@@ -0,0 +1,57 @@
+# test_validator.py
+# After any series of edits, the incremental validator must agree with
+# runs.extractRuns on the whole grid.
+
+import random
+import unittest
+from validator import ClueValidator
+from runs import extractRuns
+from combos import lookup
+from candidates import ALL
+
+class ClueValidatorTest(unittest.TestCase):
+  def check(self, validator):
+    # The contradictions and domains match those of the runs extracted
+    # from scratch
+
+    model = extractRuns(*validator.grid())
+    self.assertEqual(sorted(model.contradictions),
+                     validator.contradictions())
+    domains = [ALL] * len(model.cells)
+    for run in model.runs:
+      for k in run.cells:
+        domains[k] &= lookup(run.clue, len(run.cells)).union
+    self.assertEqual(dict(zip(model.cells, domains)), validator.domains)
+
+  def testRandomEdits(self):
+    rng = random.Random(1)
+    for trial in range(40):
+      rows, cols = rng.randint(2, 9), rng.randint(2, 9)
+      validator = ClueValidator(rows, cols)
+      self.check(validator)
+      for step in range(60):
+        coords = rng.randrange(rows), rng.randrange(cols)
+        clues = rng.choice([0, rng.randint(1, 45)]), rng.randint(0, 30)
+        if validator.isBlack(coords):
+          if 0 in coords or rng.random() < 0.5:
+            validator.setClue(coords, *clues)
+          else:
+            validator.setWhite(coords)
+        else:
+          validator.setBlack(coords, *clues)
+        self.check(validator)
+      rebuilt = ClueValidator(*validator.grid())
+      self.assertEqual(rebuilt.contradictions(), validator.contradictions())
+      self.assertEqual(rebuilt.domains, validator.domains)
+
+  def testBadSquares(self):
+    validator = ClueValidator(5, 5)
+    self.assertRaises(ValueError, validator.setClue, (2, 2), 10, 0)
+    self.assertRaises(ValueError, validator.setClue, (5, 2), 10, 0)
+    self.assertRaises(ValueError, validator.setBlack, (2, 7), 10, 0)
+    self.assertRaises(ValueError, validator.setWhite, (0, 3))
+    self.assertRaises(ValueError, validator.setWhite, (2, 2))
+    self.check(validator)
+
+if __name__ == '__main__':
+  unittest.main()
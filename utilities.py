@@ -72,6 +72,18 @@ def displayDialog(win, master, title, modal = False):
     win.wait_visibility()
     win.grab_set()           # make modal
 
+def watchJob(widget, job, callback, interval = 100):
+  # Call callback(job) from the Tk main loop once the kakuroCSP.SolveJob job
+  # is done.  Tk isn't thread-safe, so rather than have the worker thread
+  # call into Tk, the main loop looks at the job every interval milliseconds.
+
+  def check():
+    if job.done():
+      callback(job)
+    else:
+      widget.after(interval, check)
+  widget.after(interval, check)
+
 class StopWatch(Frame):
   def __init__(self, win):
     Frame.__init__(self, win)
@@ -0,0 +1,177 @@
+# validator.py
+# Check clues as they are entered, without rebuilding the whole grid.
+# sanityCheck extracts every run from scratch, which is fine before a solve
+# but too slow to repeat on each keystroke on a big board.  ClueValidator
+# keeps the runs of the grid, and when a square changes it rescans only the
+# runs through that square.  Changing a clue rescans nothing: only the
+# status of its two runs and the domains of their cells are recomputed.
+# Every edit returns the runs it touched, so a view can redraw just those.
+# Runs are identified by (black, direction), black being the coords of the
+# square holding the clue.
+
+from candidates import ALL
+from combos import lookup, isPossible
+from runs import ACROSS, DOWN
+
+STEPS = {ACROSS: (0, 1), DOWN: (1, 0)}
+
+class ClueValidator(object):
+  def __init__(self, rows, cols, across = None, down = None):
+    # rows, cols, across and down are as for kakuroCSP.sanityCheck.  If
+    # across and down are not given, the board starts with only the black
+    # squares of row and column 0, without clues.
+
+    self.rows, self.cols = rows, cols
+    self.clues = {}             # coords of black squares -> [across, down]
+    if across is None:
+      for c in range(cols):
+        self.clues[0, c] = [0, 0]
+      for r in range(rows):
+        self.clues[r, 0] = [0, 0]
+    else:
+      for (r, c), a in across.items():
+        if r < rows and c < cols:
+          self.clues[r, c] = [a, down.get((r, c), 0)]
+    self.runs = {}              # (black, direction) -> list of coords
+    self.owner = {}             # (coords, direction) -> black square of run
+    self.impossible = set()     # runs whose clue can't be made
+    self.domains = {}           # coords of white squares -> candidate mask
+    for black in list(self.clues):
+      for direction in STEPS:
+        self.rescan(black, direction)
+
+  def isBlack(self, coords):
+    r, c = coords
+    return r >= self.rows or c >= self.cols or coords in self.clues
+
+  def clue(self, key):
+    black, direction = key
+    return self.clues[black][0 if direction == ACROSS else 1]
+
+  def rescan(self, black, direction):
+    # Rebuild the run starting at black in the given direction, and its
+    # status and the domains of its cells
+
+    dr, dc = STEPS[direction]
+    key = (black, direction)
+    cells = []
+    r, c = black[0]+dr, black[1]+dc
+    while not self.isBlack((r, c)):
+      cells.append((r, c))
+      self.owner[(r, c), direction] = black
+      r, c = r+dr, c+dc
+    self.runs[key] = cells
+    self.review(key)
+    return key
+
+  def review(self, key):
+    # Recompute the status of a run and the domains of its cells
+
+    cells = self.runs[key]
+    clue = self.clue(key)
+    if clue and not isPossible(clue, len(cells)):
+      self.impossible.add(key)
+    else:
+      self.impossible.discard(key)
+    for cell in cells:
+      self.domains[cell] = self.domain(cell)
+
+  def runMask(self, key):
+    clue = self.clue(key)
+    if not clue:
+      return ALL
+    return lookup(clue, len(self.runs[key])).union
+
+  def domain(self, cell):
+    # Digits the white square cell could hold, as far as the lengths and
+    # clues of its runs go
+
+    mask = ALL
+    for direction in STEPS:
+      black = self.owner.get((cell, direction))
+      if black is not None:
+        mask &= self.runMask((black, direction))
+    return mask
+
+  def runThrough(self, coords, direction):
+    # The black square starting the run through white square coords
+
+    return self.owner[coords, direction]
+
+  # Edits.  Each returns the list of runs rescanned or reviewed.
+
+  def setClue(self, coords, across, down):
+    # Change the clues of a black square
+
+    r, c = coords
+    if not (0 <= r < self.rows and 0 <= c < self.cols):
+      raise ValueError('square %s.%s is off the board' % coords)
+    if coords not in self.clues:
+      raise ValueError('square %s.%s is white and has no clues' % coords)
+    self.clues[coords] = [across, down]
+    touched = [(coords, ACROSS), (coords, DOWN)]
+    for key in touched:
+      self.review(key)
+    return touched
+
+  def setBlack(self, coords, across = 0, down = 0):
+    # Make a white square black, splitting the runs through it
+
+    if self.isBlack(coords):
+      return self.setClue(coords, across, down)
+    heads = [(self.runThrough(coords, d), d) for d in STEPS]
+    for direction in STEPS:
+      del self.owner[coords, direction]
+    del self.domains[coords]
+    self.clues[coords] = [across, down]
+    touched = [self.rescan(black, d) for black, d in heads]
+    touched.extend(self.rescan(coords, d) for d in STEPS)
+    return touched
+
+  def setWhite(self, coords):
+    # Make a black square white, joining the runs on either side of it
+
+    r, c = coords
+    if not self.isBlack(coords) or r == 0 or c == 0:
+      raise ValueError('square %s.%s cannot be made white' % coords)
+    if r >= self.rows or c >= self.cols:
+      raise ValueError('square %s.%s is off the board' % coords)
+    del self.clues[coords]
+    touched = []
+    for direction, (dr, dc) in STEPS.items():
+      key = (coords, direction)
+      self.impossible.discard(key)
+      del self.runs[key]
+      touched.append(key)
+      head = (r-dr, c-dc)
+      while not self.isBlack(head):
+        head = (head[0]-dr, head[1]-dc)
+      touched.append(self.rescan(head, direction))
+    return touched
+
+  # Queries
+
+  def contradictions(self):
+    # The impossible clues, as (row, col, clue, length) tuples like those
+    # of sanityCheck, sorted by position
+
+    return sorted((black[0], black[1], self.clue((black, d)),
+                   len(self.runs[black, d]))
+                  for black, d in self.impossible)
+
+  def impossibleClues(self):
+    # The impossible clues, as (coords, direction) pairs
+
+    return sorted(self.impossible)
+
+  def grid(self):
+    # Returns (rows, cols, across, down), the arguments of sanityCheck,
+    # sentinel black squares included
+
+    across = {b: clues[0] for b, clues in self.clues.items()}
+    down = {b: clues[1] for b, clues in self.clues.items()}
+    for r in range(self.rows+1):
+      across[r, self.cols] = down[r, self.cols] = 0
+    for c in range(self.cols+1):
+      across[self.rows, c] = down[self.rows, c] = 0
+    return self.rows, self.cols, across, down